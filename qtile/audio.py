@@ -0,0 +1,130 @@
+"""
+In-process volume control.
+
+The volume keys used to spawn pulseaudio-ctl on every press, so holding a
+key forked a process per repeat and the results could land out of order.
+Here key presses only move a target level; once per frame the latest target
+is sent over libqtile's shared pulse connection, and the Volume widget is
+updated from the server's change events rather than by polling.
+"""
+
+import asyncio
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+from libqtile.utils import create_task
+from libqtile.widget.pulse_volume import pulse
+from qtile_extras import widget
+
+from damage import DamageMixin
+
+STEP = 5
+FRAME = 1 / 60
+
+
+class VolumeController:
+    def __init__(self, step=STEP, frame=FRAME):
+        self.step = step
+        self.frame = frame
+        self._target = None
+        # Last level sent, until the sink reports it back
+        self._committed = None
+        # Commits flushed but not finished; only changed by _flush and,
+        # holding the lock, _commit
+        self._in_flight = 0
+        self._mute_toggles = 0
+        self._handle = None
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.commits = 0
+        # Keeps the shared pulse connection open even without a widget
+        pulse.subscribe(self._on_change)
+
+    def _on_change(self, vol, muted):
+        if self._committed is None:
+            return
+        # Older commits may still report in while a newer one is queued or
+        # being sent, so anything else only counts once none are left
+        if vol == self._committed or not self._in_flight:
+            self._committed = None
+
+    def _current(self):
+        if self._target is not None:
+            return self._target
+        if self._committed is not None:
+            # The sink may not have applied it yet, so it's the base for repeats
+            return self._committed
+        vol, _ = pulse.get_volume() if pulse.pulse is not None else (None, None)
+        return vol if vol is not None and vol >= 0 else None
+
+    def change(self, delta):
+        current = self._current()
+        if current is None:
+            logger.warning("No pulse sink available to change volume")
+            return
+        self.requests += 1
+        self._target = max(0, min(100, current + delta))
+        self._schedule()
+
+    def toggle_mute(self):
+        self.requests += 1
+        self._mute_toggles += 1
+        self._schedule()
+
+    def _schedule(self):
+        # Everything that arrives within a frame is merged into one commit
+        if self._handle is None:
+            self._handle = qtile.call_later(self.frame, self._flush)
+
+    def _flush(self):
+        self._handle = None
+        target, self._target = self._target, None
+        if target is not None:
+            self._committed = target
+        toggle, self._mute_toggles = self._mute_toggles % 2, 0
+        self._in_flight += 1
+        create_task(self._commit(target, toggle))
+
+    async def _commit(self, target, toggle):
+        # Serialised so an older level can never land after a newer one
+        async with self._lock:
+            try:
+                sink = pulse.default_sink
+                if pulse.pulse is None or not pulse.pulse.connected or sink is None:
+                    self._committed = None
+                    return
+                self.commits += 1
+                if target is not None:
+                    base = sink.base_volume or 1.0
+                    await pulse.pulse.volume_set_all_chans(sink, target * base / 100)
+                if toggle:
+                    await pulse.pulse.sink_mute(sink.index, not sink.mute)
+            finally:
+                self._in_flight -= 1
+
+
+if "controller" not in globals():
+    controller = None
+
+
+def _controller():
+    global controller
+    if controller is None:
+        controller = VolumeController()
+    return controller
+
+
+def raise_volume(qtile):
+    _controller().change(STEP)
+
+
+def lower_volume(qtile):
+    _controller().change(-STEP)
+
+
+def toggle_mute(qtile):
+    _controller().toggle_mute()
+
+
+class Volume(DamageMixin, widget.PulseVolume):
+    pass
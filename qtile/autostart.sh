@@ -1,6 +1,5 @@
 #!/bin/sh
 thunar --daemon &
-greenclip daemon &
 xrwandr --output Virtual-1 --mode 1920x1080 &
 nitrogen --rectore &
 picom &
@@ -0,0 +1,167 @@
+"""
+Backlight control straight through sysfs.
+
+The brightness keys used to run `sudo brillo` per key event, paying for
+sudo and a process launch each time, and held keys started overlapping
+fades. Here the brightness file stays open (write access comes from a udev
+rule granting the video group, no sudo), key repeats just move one target,
+and a single timer ramps towards it. The Backlight widget subscribes to
+changes instead of polling.
+
+    ACTION=="add", SUBSYSTEM=="backlight", RUN+="/bin/chgrp video $sys$devpath/brightness", RUN+="/bin/chmod g+w $sys$devpath/brightness"
+"""
+
+import os
+import time
+
+from libqtile import qtile
+from libqtile.command.base import expose_command
+from libqtile.log_utils import logger
+from libqtile.widget.backlight import ChangeDirection
+from qtile_extras import widget
+
+from damage import DamageMixin
+
+BACKLIGHT_DIR = "/sys/class/backlight"
+STEP = 5
+RAMP = 0.2
+FRAME = 1 / 60
+MIN_PERCENT = 1
+
+
+def device_path(name=None, root=BACKLIGHT_DIR):
+    """Resolved sysfs directory of the named device, or of the first one."""
+    if name is None:
+        devices = sorted(os.listdir(root))
+        if not devices:
+            raise FileNotFoundError(f"No backlight devices in {root}")
+        name = devices[0]
+    device = os.path.realpath(os.path.join(root, name))
+    if not os.path.isdir(device):
+        raise FileNotFoundError(f"No backlight device {name} in {root}")
+    return device
+
+
+class BacklightController:
+    def __init__(self, device, ramp=RAMP, frame=FRAME):
+        with open(os.path.join(device, "max_brightness")) as f:
+            self.max = int(f.read())
+        self._fd = os.open(os.path.join(device, "brightness"), os.O_RDWR)
+        self.value = int(os.pread(self._fd, 32, 0))
+        self.target = self.value
+        self.ramp = ramp
+        self.frame = frame
+        self.callbacks = set()
+        self._handle = None
+        self._from = self.value
+        self._start = 0.0
+        self.requests = 0
+        self.writes = 0
+
+    @property
+    def percent(self):
+        return self.value * 100 / self.max
+
+    def change(self, delta):
+        """Move the target by delta percent; repeats just move it further."""
+        self.requests += 1
+        low = self.max * MIN_PERCENT / 100
+        target = self.target + self.max * delta / 100
+        self.target = round(max(low, min(self.max, target)))
+        # Restart the ramp from wherever the previous one had got to
+        self._from = self.value
+        self._start = time.monotonic()
+        if self._handle is None:
+            self._step()
+
+    def _step(self):
+        self._handle = None
+        t = min((time.monotonic() - self._start) / self.ramp, 1) if self.ramp else 1
+        value = round(self._from + (self.target - self._from) * t)
+        if value != self.value:
+            self._write(value)
+        if value != self.target:
+            self._handle = qtile.call_later(self.frame, self._step)
+
+    def _write(self, value):
+        try:
+            os.pwrite(self._fd, str(value).encode(), 0)
+        except OSError:
+            logger.exception("Failed to set backlight brightness")
+            self.target = self.value
+            return
+        self.value = value
+        self.writes += 1
+        for callback in self.callbacks:
+            callback(self.percent)
+
+    def subscribe(self, callback):
+        self.callbacks.add(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+
+if "controllers" not in globals():
+    # resolved device path -> BacklightController, so the keys and the
+    # widget share one ramp whichever name they reach the device by
+    controllers = {}
+
+
+def _controller(name=None):
+    device = device_path(name)
+    controller = controllers.get(device)
+    if controller is None:
+        controller = controllers[device] = BacklightController(device)
+    return controller
+
+
+def raise_brightness(qtile):
+    try:
+        _controller().change(STEP)
+    except OSError:
+        logger.exception("No usable backlight device")
+
+
+def lower_brightness(qtile):
+    try:
+        _controller().change(-STEP)
+    except OSError:
+        logger.exception("No usable backlight device")
+
+
+class Backlight(DamageMixin, widget.Backlight):
+    def __init__(self, **config):
+        # Changes are pushed by the controller; read the level once at startup
+        config.setdefault("update_interval", None)
+        super().__init__(**config)
+
+    def _configure(self, qtile, bar):
+        try:
+            self.controller = _controller(self.backlight_name)
+        except OSError:
+            logger.exception("No backlight device %s", self.backlight_name)
+            self.controller = None
+        else:
+            self.controller.subscribe(self._on_change)
+        super()._configure(qtile, bar)
+
+    def poll(self):
+        if self.controller is None:
+            return ""
+        return self.format.format(percent=self.controller.percent / 100)
+
+    @expose_command()
+    def change_backlight(self, direction, step=None):
+        if self.controller is None:
+            return
+        step = step or self.step
+        self.controller.change(step if direction is ChangeDirection.UP else -step)
+
+    def _on_change(self, percent):
+        self.update(self.format.format(percent=percent / 100))
+
+    def finalize(self):
+        if getattr(self, "controller", None) is not None:
+            self.controller.unsubscribe(self._on_change)
+        super().finalize()
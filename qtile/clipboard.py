@@ -0,0 +1,258 @@
+"""
+Own the X clipboard from inside qtile.
+
+Data offered here is served straight from memory to whoever pastes it,
+with no helper process (xclip, flameshot...) holding it. A target's
+data may still be an unfinished future, for example a PNG being encoded
+in a worker thread. Ownership is taken immediately and a paste that
+comes in early is answered once the data is ready. Large data goes out
+in INCR chunks as ICCCM requires. The same window is used to read what
+other clients put on the selection.
+"""
+
+import asyncio
+import struct
+
+import xcffib
+import xcffib.xproto
+from libqtile.log_utils import logger
+from xcffib.xproto import CW, Atom, EventMask, PropMode, Property, Time, WindowClass
+
+# Upper bound for one ChangeProperty; INCR is used above this
+MAX_CHUNK = 256 * 1024
+# Seconds to wait for another client to answer a request
+REQUEST_TIMEOUT = 5
+
+
+class SelectionOwner:
+    def __init__(self, selection="CLIPBOARD", display=None):
+        self.conn = xcffib.connect(display=display)
+        self.root = self.conn.get_setup().roots[self.conn.pref_screen].root
+        self._atoms = {}
+        self.selection = self.atom(selection)
+        self.wid = self.conn.generate_id()
+        self.conn.core.CreateWindow(
+            0,
+            self.wid,
+            self.root,
+            -1,
+            -1,
+            1,
+            1,
+            0,
+            WindowClass.InputOnly,
+            0,
+            CW.EventMask,
+            [EventMask.PropertyChange],
+        )
+        self.chunk = min(MAX_CHUNK, self.conn.get_maximum_request_length() * 4 - 64)
+        # target atom -> bytes or asyncio.Future, and the same by name
+        self._served = {}
+        self.offered = {}
+        self.owned = False
+        # (requestor, property) -> [data, offset, target] for INCR transfers
+        self._transfers = {}
+        # target atom -> [future, bytearray or None while not INCR]
+        self._requests = {}
+        self.callbacks = set()
+        self.served = 0
+        asyncio.get_running_loop().add_reader(self.conn.get_file_descriptor(), self._pump)
+        self.conn.flush()
+
+    def atom(self, name):
+        atom = self._atoms.get(name)
+        if atom is None:
+            reply = self.conn.core.InternAtom(False, len(name), name).reply()
+            atom = self._atoms[name] = reply.atom
+        return atom
+
+    def offer(self, targets):
+        """Take the selection, serving {mime type: bytes or future}."""
+        self.offered = targets
+        self._served = {self.atom(name): data for name, data in targets.items()}
+        self.conn.core.SetSelectionOwner(self.wid, self.selection, Time.CurrentTime)
+        self.conn.flush()
+        self.owned = True
+        for callback in self.callbacks:
+            callback(True)
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.conn.get_file_descriptor())
+        self.conn.disconnect()
+
+    def subscribe(self, callback):
+        """callback(owned) when the selection is taken or lost."""
+        self.callbacks.add(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+    def _pump(self):
+        while True:
+            try:
+                event = self.conn.poll_for_event()
+            except xcffib.ConnectionException:
+                logger.exception("Lost the clipboard connection")
+                asyncio.get_running_loop().remove_reader(self.conn.get_file_descriptor())
+                return
+            except Exception:
+                logger.exception("Bad event on the clipboard connection")
+                continue
+            if event is None:
+                break
+            if isinstance(event, xcffib.xproto.SelectionNotifyEvent):
+                self._on_reply(event)
+            elif isinstance(event, xcffib.xproto.SelectionRequestEvent):
+                self._on_request(event)
+            elif isinstance(event, xcffib.xproto.PropertyNotifyEvent):
+                self._on_property(event)
+            elif isinstance(event, xcffib.xproto.SelectionClearEvent):
+                if event.selection == self.selection:
+                    self.owned = False
+                    self._served = {}
+                    self.offered = {}
+                    for callback in self.callbacks:
+                        callback(False)
+        self.conn.flush()
+
+    def _notify(self, event, prop):
+        reply = xcffib.xproto.SelectionNotifyEvent.synthetic(
+            event.time, event.requestor, event.selection, event.target, prop
+        )
+        self.conn.core.SendEvent(False, event.requestor, EventMask.NoEvent, reply.pack())
+        self.conn.flush()
+
+    def _on_request(self, event):
+        # Obsolete clients leave the property out
+        prop = event.property or event.target
+        if event.selection != self.selection or not self.owned:
+            self._notify(event, Atom._None)
+        elif event.target == self.atom("TARGETS"):
+            atoms = [self.atom("TARGETS"), *self._served]
+            self.conn.core.ChangeProperty(
+                PropMode.Replace, event.requestor, prop, Atom.ATOM, 32, len(atoms), atoms
+            )
+            self._notify(event, prop)
+        elif event.target in self._served:
+            data = self._served[event.target]
+            if isinstance(data, asyncio.Future):
+                data.add_done_callback(lambda f: self._send(event, prop, f))
+            else:
+                self._send(event, prop, data)
+        else:
+            self._notify(event, Atom._None)
+
+    def _send(self, event, prop, data):
+        if isinstance(data, asyncio.Future):
+            if data.cancelled() or data.exception() is not None:
+                self._notify(event, Atom._None)
+                return
+            data = data.result()
+        self.served += 1
+        if len(data) <= self.chunk:
+            self.conn.core.ChangeProperty(
+                PropMode.Replace, event.requestor, prop, event.target, 8, len(data), data
+            )
+        else:
+            # Watch the requestor delete each chunk before sending the next
+            self.conn.core.ChangeWindowAttributes(
+                event.requestor, CW.EventMask, [EventMask.PropertyChange]
+            )
+            self.conn.core.ChangeProperty(
+                PropMode.Replace, event.requestor, prop, self.atom("INCR"), 32, 1, [len(data)]
+            )
+            self._transfers[(event.requestor, prop)] = [data, 0, event.target]
+        self._notify(event, prop)
+
+    def _on_property(self, event):
+        if event.window == self.wid:
+            if event.state == Property.NewValue:
+                self._on_incr_chunk(event)
+            return
+        transfer = self._transfers.get((event.window, event.atom))
+        if transfer is None or event.state != Property.Delete:
+            return
+        data, offset, target = transfer
+        chunk = data[offset : offset + self.chunk]
+        self.conn.core.ChangeProperty(
+            PropMode.Replace, event.window, event.atom, target, 8, len(chunk), chunk
+        )
+        if chunk:
+            transfer[1] += len(chunk)
+        else:
+            # The empty chunk ends the transfer
+            del self._transfers[(event.window, event.atom)]
+            self.conn.core.ChangeWindowAttributes(event.window, CW.EventMask, [0])
+
+    async def request(self, target):
+        """The selection's current contents as target (an atom name), or None."""
+        atom = self.atom(target)
+        loop = asyncio.get_running_loop()
+        if atom in self._requests:
+            return await asyncio.shield(self._requests[atom][0])
+        future = loop.create_future()
+        self._requests[atom] = [future, None]
+        self.conn.core.ConvertSelection(
+            self.wid, self.selection, atom, self.atom(target), Time.CurrentTime
+        )
+        self.conn.flush()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._requests.pop(atom, None)
+
+    async def targets(self):
+        """Atom names the selection owner can convert to."""
+        data = await self.request("TARGETS")
+        if not data:
+            return []
+        atoms = struct.unpack(f"={len(data) // 4}I", data[: len(data) // 4 * 4])
+        names = []
+        for atom in atoms:
+            reply = self.conn.core.GetAtomName(atom).reply()
+            names.append(reply.name.to_string())
+        return names
+
+    def _read_property(self, prop):
+        reply = self.conn.core.GetProperty(
+            True, self.wid, prop, xcffib.xproto.GetPropertyType.Any, 0, 2**30
+        ).reply()
+        return reply.type, reply.value.buf()
+
+    def _on_reply(self, event):
+        pending = self._requests.get(event.target)
+        if pending is None or event.requestor != self.wid:
+            return
+        future = pending[0]
+        if event.property == Atom._None:
+            future.set_result(None)
+            return
+        kind, value = self._read_property(event.property)
+        if kind == self.atom("INCR"):
+            # Deleting the property asked for the first chunk
+            pending[1] = bytearray()
+        else:
+            future.set_result(bytes(value))
+
+    def _on_incr_chunk(self, event):
+        pending = self._requests.get(event.atom)
+        if pending is None or pending[1] is None:
+            return
+        _, value = self._read_property(event.atom)
+        if value:
+            pending[1] += value
+        elif not pending[0].done():
+            pending[0].set_result(bytes(pending[1]))
+
+
+if "owner" not in globals():
+    owner = None
+
+
+def get_owner():
+    global owner
+    if owner is None:
+        owner = SelectionOwner()
+    return owner
@@ -0,0 +1,391 @@
+"""
+Clipboard history kept by qtile.
+
+greenclip ran as a separate daemon, and every mod+v started another
+greenclip process that deserialised the whole history for rofi. Here
+qtile records each new CLIPBOARD itself: text arrives through the
+selection_change hook (qtile follows the selection with XFixes already),
+and for an owner that offers only images the image is fetched once.
+Clips are deduplicated by SHA-1 and appended to a fixed-size ring file
+that is memory mapped. The oldest records are overwritten as it wraps,
+so the file never grows. Large clips (images, long text) live in their
+own file under blobs/ and the ring only holds a reference to them. The
+entries and their search text are held in memory, newest first, so
+opening the picker just draws the first rows, and a paste maps the blob
+instead of copying it.
+"""
+
+import asyncio
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+from libqtile import hook
+from libqtile.log_utils import logger
+from libqtile.utils import create_task
+
+import clipboard
+import switcher
+
+DATA_DIR = os.path.join(
+    os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+    "qtile",
+    "clipboard",
+)
+CAPACITY = 4 * 1024 * 1024
+MAX_ENTRIES = 200
+# Clips larger than this go to a blob file
+MAX_INLINE = 16 * 1024
+MAX_BLOB = 64 * 1024 * 1024
+# Characters of each clip kept in memory for searching
+SEARCH_CHARS = 4096
+
+TEXT = 1
+BLOB = 2
+
+# magic, version, capacity, head, tail, next seq, records
+_HEADER = struct.Struct("<4sI5Q")
+# magic, payload length, seq, time, kind, sha1
+_RECORD = struct.Struct("<4sIQdB20s")
+_MAGIC = b"QCLP"
+_RECORD_MAGIC = b"CLIP"
+_WRAP = b"WRAP"
+_VERSION = 1
+
+TEXT_TARGETS = ("UTF8_STRING", "text/plain;charset=utf-8", "text/plain", "STRING", "TEXT")
+IMAGE_TARGETS = ("image/png", "image/jpeg", "image/bmp", "image/gif", "image/webp")
+
+
+class _Newest:
+    """Entries newest first without copying the list."""
+
+    def __init__(self, entries):
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._entries[-1 - j] for j in range(*i.indices(len(self._entries)))]
+        return self._entries[-1 - i]
+
+    def __iter__(self):
+        return reversed(self._entries)
+
+
+class ClipHistory:
+    def __init__(self, data_dir=DATA_DIR, capacity=CAPACITY, max_entries=MAX_ENTRIES):
+        self.data_dir = data_dir
+        self.blob_dir = os.path.join(data_dir, "blobs")
+        self.capacity = capacity
+        self.max_entries = max_entries
+        # Live entries, oldest first
+        self.entries = []
+        # sha1 -> live entry
+        self.by_hash = {}
+        # Every record still in the ring, live or not, in write order
+        self._records = []
+        self._mm = None
+        self.head = self.tail = self.seq = 0
+        self.stats = {"added": 0, "duplicates": 0, "evicted": 0}
+
+    def open(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        path = os.path.join(self.data_dir, "history.ring")
+        size = _HEADER.size + self.capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        header = _HEADER.unpack_from(self._mm, 0)
+        if fresh or header[:3] != (_MAGIC, _VERSION, self.capacity):
+            self._write_header(0, 0, 0, 0)
+        else:
+            self._load(*header[3:])
+        self._sweep_blobs()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+
+    def _write_header(self, head, tail, seq, count):
+        self.head, self.tail, self.seq = head, tail, seq
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, self.capacity, head, tail, seq, count)
+
+    def _load(self, head, tail, seq, count):
+        self.head, self.tail, self.seq = head, tail, seq
+        offset = tail
+        for _ in range(count):
+            if offset + _RECORD.size > self.capacity or self._read(offset, 4) == _WRAP:
+                offset = 0
+            magic, length, rec_seq, when, kind, digest = _RECORD.unpack_from(
+                self._mm, _HEADER.size + offset
+            )
+            end = offset + _RECORD.size + length
+            if magic != _RECORD_MAGIC or end > self.capacity:
+                logger.warning(
+                    "Clipboard history is damaged after record %d", len(self._records)
+                )
+                break
+            record = self._entry(offset, end, rec_seq, when, kind, digest)
+            self._records.append(record)
+            self._make_live(record)
+            offset = end
+        # Older duplicates and entries over the cap were dropped while running
+        while len(self.entries) > self.max_entries:
+            self._kill(self.entries[0])
+
+    def _read(self, offset, length):
+        start = _HEADER.size + offset
+        return self._mm[start : start + length]
+
+    def _entry(self, offset, end, seq, when, kind, digest):
+        payload = self._read(offset + _RECORD.size, end - offset - _RECORD.size)
+        if kind == BLOB:
+            mime, size, preview = payload.decode(errors="replace").split("\0", 2)
+            label = preview or f"[{mime}, {int(size) // 1024} KiB]"
+        else:
+            mime, size, label = "text/plain", len(payload), payload.decode(errors="replace")
+        return {
+            "offset": offset,
+            "end": end,
+            "seq": seq,
+            "time": when,
+            "kind": kind,
+            "hash": digest,
+            "mime": mime,
+            "size": int(size),
+            "label": " ".join(label[:200].split()),
+            "search": label[:SEARCH_CHARS].lower(),
+            "live": False,
+        }
+
+    def _make_live(self, entry):
+        old = self.by_hash.get(entry["hash"])
+        if old is not None:
+            old["live"] = False
+            self.entries.remove(old)
+        entry["live"] = True
+        self.by_hash[entry["hash"]] = entry
+        self.entries.append(entry)
+
+    def _kill(self, entry, unlink=True):
+        entry["live"] = False
+        self.entries.remove(entry)
+        del self.by_hash[entry["hash"]]
+        if unlink and entry["kind"] == BLOB:
+            try:
+                os.unlink(self.blob_path(entry["hash"]))
+            except FileNotFoundError:
+                pass
+
+    def _sweep_blobs(self):
+        live = {e["hash"].hex() for e in self.entries if e["kind"] == BLOB}
+        for name in os.listdir(self.blob_dir):
+            if name not in live:
+                os.unlink(os.path.join(self.blob_dir, name))
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest.hex())
+
+    def add(self, data, mime="text/plain"):
+        """Record a clip; returns its entry."""
+        sha1 = hashlib.sha1(mime.encode() + b"\0")
+        # Mapped blobs are hashed in place
+        sha1.update(data)
+        digest = sha1.digest()
+        old = self.by_hash.get(digest)
+        if old is not None and old is self.entries[-1]:
+            self.stats["duplicates"] += 1
+            return old
+        if len(data) > MAX_BLOB:
+            logger.info("Not keeping a %d byte clip in the history", len(data))
+            return None
+        if mime.startswith("text/") and len(data) <= MAX_INLINE:
+            kind, payload = TEXT, bytes(data)
+        else:
+            kind = BLOB
+            preview = ""
+            if mime.startswith("text/"):
+                preview = bytes(data[:SEARCH_CHARS]).decode(errors="replace")
+            payload = f"{mime}\0{len(data)}\0{preview}".encode()
+            path = self.blob_path(digest)
+            if not os.path.exists(path):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+        if old is not None:
+            self.stats["duplicates"] += 1
+            # Moves to the front; the blob is shared with the new record
+            self._kill(old, unlink=False)
+        entry = self._append(kind, digest, payload)
+        self.stats["added"] += 1
+        while len(self.entries) > self.max_entries:
+            self._kill(self.entries[0])
+        return entry
+
+    def _append(self, kind, digest, payload):
+        need = _RECORD.size + len(payload)
+        pos = self.head
+        if pos + need > self.capacity:
+            # Nothing fits past here, start again from the beginning
+            self._evict_from(pos, self.capacity)
+            if pos + 4 <= self.capacity:
+                self._mm[_HEADER.size + pos : _HEADER.size + pos + 4] = _WRAP
+            pos = 0
+        self._evict_from(pos, pos + need)
+        when = time.time()
+        start = _HEADER.size + pos
+        _RECORD.pack_into(
+            self._mm, start, _RECORD_MAGIC, len(payload), self.seq, when, kind, digest
+        )
+        self._mm[start + _RECORD.size : start + need] = payload
+        entry = self._entry(pos, pos + need, self.seq, when, kind, digest)
+        self._records.append(entry)
+        self._make_live(entry)
+        tail = self._records[0]["offset"]
+        self._write_header(pos + need, tail, self.seq + 1, len(self._records))
+        return entry
+
+    def _evict_from(self, start, end):
+        # The oldest records sit right after the head; drop those in the way
+        while self._records and start <= self._records[0]["offset"] < end:
+            record = self._records.pop(0)
+            if record["live"]:
+                self.stats["evicted"] += 1
+                self._kill(record)
+        if self._records:
+            self._write_header(
+                self.head, self._records[0]["offset"], self.seq, len(self._records)
+            )
+        else:
+            self._write_header(self.head, start, self.seq, 0)
+
+    def data(self, entry):
+        """The clip's bytes; blobs are mapped rather than read."""
+        if entry["kind"] == TEXT:
+            start = entry["offset"] + _RECORD.size
+            return self._read(start, entry["end"] - start)
+        with open(self.blob_path(entry["hash"]), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def offer(self, entry):
+        data = self.data(entry)
+        owner = clipboard.get_owner()
+        if entry["mime"].startswith("text/"):
+            owner.offer({target: data for target in TEXT_TARGETS})
+        else:
+            owner.offer({entry["mime"]: data})
+
+    def search(self, query, candidates=None):
+        """Entries containing query, newest first; candidates narrows the search."""
+        if not query:
+            return _Newest(self.entries)
+        records = _Newest(self.entries) if candidates is None else candidates
+        return [e for e in records if query in e["search"]]
+
+
+class ClipPicker(switcher.Switcher):
+    noun = "clips"
+    start_at = 0
+
+    def label(self, record):
+        return record["label"] or f"[{record['mime']}]"
+
+    def icon(self, record):
+        return None
+
+    def choose(self, record):
+        history.offer(record)
+        return False
+
+
+if "history" not in globals():
+    history = ClipHistory()
+    picker = ClipPicker(history)
+
+
+def on_selection_change(name, selection):
+    if name == "CLIPBOARD" and selection["selection"]:
+        history.add(selection["selection"].encode())
+
+
+def on_selection_notify(name, selection):
+    if name == "CLIPBOARD" and selection["owner"]:
+        create_task(_record_image(selection["owner"]))
+
+
+async def _record_image(wid):
+    # Runs as its own task, and owners that don't answer properly are common
+    try:
+        owner = clipboard.get_owner()
+        if wid == owner.wid:
+            # Our own offer (a screenshot, or a clip picked from the history)
+            mime = next((t for t in IMAGE_TARGETS if t in owner.offered), None)
+            data = owner.offered.get(mime)
+            if isinstance(data, asyncio.Future):
+                data = await data
+        else:
+            targets = await owner.targets()
+            if any(t in targets for t in TEXT_TARGETS):
+                # selection_change brings the text
+                return
+            mime = next((t for t in IMAGE_TARGETS if t in targets), None)
+            data = await owner.request(mime) if mime is not None else None
+        if data:
+            history.add(data, mime)
+    except Exception:
+        logger.debug("Could not record the clipboard of window %s", wid, exc_info=True)
+
+
+def install():
+    # Hooks are cleared on reload, so this runs on every config load
+    if history._mm is None:
+        try:
+            history.open()
+        except OSError:
+            logger.exception("Could not open the clipboard history")
+            return
+    hook.subscribe.selection_change(on_selection_change)
+    hook.subscribe.selection_notify(on_selection_notify)
+
+
+def show(qtile):
+    picker.open()
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    # Picker open and search cost against history size: python cliphist.py [count]
+    count = int(sys.argv[1]) if sys.argv[1:] else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        bench = ClipHistory(tmp, max_entries=count)
+        bench.open()
+        start = time.perf_counter()
+        for i in range(count):
+            bench.add(f"clip {i} {'lorem ipsum ' * (i % 40)}".encode())
+        print(f"{'add':>8}: {(time.perf_counter() - start) / count * 1e6:8.1f}us per clip")
+        start = time.perf_counter()
+        found = bench.search("clip 1")
+        elapsed = time.perf_counter() - start
+        print(f"{'search':>8}: {elapsed * 1e3:8.2f}ms, {len(found)} of {len(bench.entries)}")
+        for size in (count, count // 100 or 1):
+            while len(bench.entries) > size:
+                bench._kill(bench.entries[0])
+            bench.search("")
+            start = time.perf_counter()
+            bench.search("")[0 : switcher.ROWS]
+            elapsed = time.perf_counter() - start
+            print(f"{'open':>8}: {elapsed * 1e6:8.1f}us with {len(bench.entries)} clips")
+        bench.close()
@@ -29,36 +29,74 @@ import os, subprocess
 
 from qtile_extras import widget, layout
 from qtile_extras.layout.decorations import ScreenGradientBorder
-from qtile_extras.widget.decorations import PowerLineDecoration, RectDecoration
-from libqtile.config import Click, Drag, Group, Key, Match, Screen
+from qtile_extras.widget.decorations import PowerLineDecoration
+from libqtile.config import Click, Drag, Group, Key, Match
 from libqtile.lazy import lazy
+from libqtile.log_utils import logger
 from libqtile.utils import guess_terminal
 
+import audio
+import backlight
+import cliphist
+import damage
+import floatrules
+import focus
+import launcher
+import layoutstate
+import media
+import metrics
+import monitors
+import reconcile
+import restore
+import runner
+import screenshot
+import session
+import switcher
+import textcache
+import ticker
+import titles
+import transaction
+import updates
+import visibility
+import wallpaper
+
+# Measure text once across every bar and monitor
+textcache.install()
+
+# On reload_config this runs while the old groups still exist
+layoutstate.capture()
+hook.subscribe.addgroup(layoutstate.freeze)
+hook.subscribe.startup(layoutstate.apply)
+hook.subscribe.user("layout_batch")(transaction.run)
+hook.subscribe.client_mouse_enter(focus.coalescer.on_enter)
+hook.subscribe.client_focus(focus.coalescer.on_focus)
+hook.subscribe.client_name_updated(titles.throttle.on_name_updated)
+hook.subscribe.client_killed(titles.throttle.forget)
+hook.subscribe.startup_once(launcher.get_index)
+switcher.install()
+cliphist.install()
+
 mod = "mod4"
 terminal = guess_terminal()
 
 
 def window_to_previous_screen(qtile, switch_group=False, switch_screen=False):
-    i = qtile.screens.index(qtile.current_screen)
-    if i != 0:
-        group = qtile.screens[i - 1].group.name
-        qtile.current_window.togroup(group, switch_group=switch_group)
-        if switch_screen == True:
-            qtile.cmd_to_screen(i - 1)
+    transaction.window_to_screen(qtile, -1, switch_group, switch_screen)
 
 
 def window_to_next_screen(qtile, switch_group=False, switch_screen=False):
-    i = qtile.screens.index(qtile.current_screen)
-    if i + 1 != len(qtile.screens):
-        group = qtile.screens[i + 1].group.name
-        qtile.current_window.togroup(group, switch_group=switch_group)
-        if switch_screen == True:
-            qtile.cmd_to_screen(i + 1)
+    transaction.window_to_screen(qtile, 1, switch_group, switch_screen)
+
+
+@lazy.function
+def shell(qtile, command, timeout=None, on_output=None, notify=False):
+    # Runs in the background so the event loop never waits on the command
+    runner.runner.run(command, timeout=timeout, on_output=on_output, notify=notify)
 
 
 @lazy.function
-def shell(qtile, command):
-    os.system(command)
+def cancel_shell(qtile, job_id=None):
+    runner.runner.cancel(job_id)
 
 
 keys = [
@@ -103,16 +141,23 @@ keys = [
         desc="Toggle between split and unsplit sides of stack",
     ),
     Key([mod], "Return", lazy.spawn(terminal), desc="Launch terminal"),
-    Key([mod], "b", lazy.spawn("qutebrowser"), desc="Launch Qutebrowser"),
-    Key([mod, "shift"], "b", lazy.spawn("firefox"), desc="Launch Firefox"),
-    Key([mod], "s", lazy.spawn("bash -c 'env LD_PRELOAD=/usr/lib/spotify-adblock.so spotify --uri=%U'"), desc="Launch Spotify"),
-    Key([mod, "shift"], "s", lazy.spawn("solanum"), desc="Launch Solanum"),
-    Key([mod], "o", lazy.spawn("obsidian"), desc="Launch Obsidian"),
-    Key([mod], "a", lazy.spawn("anki"), desc="Launch Anki"),
-    Key([mod, "shift"], "t", lazy.spawn("thunar"), desc="Launch Thunar"),
-    Key([mod, "shift"], "w", lazy.spawn("whatsapp-for-linux"), desc="Launch Whatsapp for Linux"),
-    Key([mod], "t", lazy.spawn("teams"), desc="Launch MS Teams"),
-    Key([mod], "d", lazy.spawn("discord"), desc="Launch Discord"),
+    Key([mod], "b", lazy.function(launcher.run, "qutebrowser"), desc="Launch Qutebrowser"),
+    Key([mod, "shift"], "b", lazy.function(launcher.run, "firefox"), desc="Launch Firefox"),
+    Key(
+        [mod],
+        "s",
+        lazy.function(
+            launcher.run, "spotify", env={"LD_PRELOAD": "/usr/lib/spotify-adblock.so"}
+        ),
+        desc="Launch Spotify",
+    ),
+    Key([mod, "shift"], "s", lazy.function(launcher.run, "solanum"), desc="Launch Solanum"),
+    Key([mod], "o", lazy.function(launcher.run, "obsidian"), desc="Launch Obsidian"),
+    Key([mod], "a", lazy.function(launcher.run, "anki"), desc="Launch Anki"),
+    Key([mod, "shift"], "t", lazy.function(launcher.run, "thunar"), desc="Launch Thunar"),
+    Key([mod, "shift"], "w", lazy.function(launcher.run, "whatsapp-for-linux"), desc="Launch Whatsapp for Linux"),
+    Key([mod], "t", lazy.function(launcher.run, "teams"), desc="Launch MS Teams"),
+    Key([mod], "d", lazy.function(launcher.run, "discord"), desc="Launch Discord"),
     # Toggle between different layouts as defined below
     Key([mod], "Tab", lazy.next_layout(), desc="Toggle between layouts"),
     Key([mod], "q", lazy.window.kill(), desc="Kill focused window"),
@@ -133,14 +178,14 @@ keys = [
     Key(
         [mod],
         "r",
-        lazy.spawn("rofi -show drun"),
-        desc="Launch application menu with rofi",
+        lazy.function(launcher.menu),
+        desc="Launch application menu",
     ),
     Key(
         [mod],
         "w",
-        lazy.spawn("rofi -show window"),
-        desc="Switch between open windows with rofi",
+        lazy.function(switcher.show),
+        desc="Switch between open windows",
     ),
     Key(
         [mod], "f", lazy.spawn("rofi -show filebrowser"), desc="Browse files with rofi"
@@ -154,10 +199,8 @@ keys = [
     Key(
         [mod],
         "v",
-        lazy.spawn(
-            "rofi -modi 'clipboard:greenclip print' -show clipboard -run-command '{cmd}'"
-        ),
-        desc="Show clipboard history with rofi",
+        lazy.function(cliphist.show),
+        desc="Show clipboard history",
     ),
     Key(
         [mod, "shift"],
@@ -190,44 +233,51 @@ keys = [
     Key(
         [],
         "XF86AudioLowerVolume",
-        lazy.spawn("pulseaudio-ctl down"),
+        lazy.function(audio.lower_volume),
         desc="Lower Volume by 5%",
     ),
     Key(
         [],
         "XF86AudioRaiseVolume",
-        lazy.spawn("pulseaudio-ctl up"),
+        lazy.function(audio.raise_volume),
         desc="Raise Volume by 5%",
     ),
     Key(
         [],
         "XF86AudioMute",
-        lazy.spawn("pulseaudio-ctl mute"),
+        lazy.function(audio.toggle_mute),
         desc="Mute/Unmute Volume",
     ),
     Key(
         [],
         "XF86AudioPlay",
-        lazy.spawn("playerctl play-pause"),
+        lazy.function(media.play_pause),
         desc="Play/Pause player",
     ),
-    Key([], "XF86AudioNext", lazy.spawn("playerctl next"), desc="Skip to next"),
-    Key([], "XF86AudioPrev", lazy.spawn("playerctl previous"), desc="Skip to previous"),
+    Key([], "XF86AudioNext", lazy.function(media.next_track), desc="Skip to next"),
+    Key([], "XF86AudioPrev", lazy.function(media.previous_track), desc="Skip to previous"),
     Key(
         ['control'],
         "Page_Up",
-        lazy.spawn("playerctl play-pause"),
+        lazy.function(media.play_pause),
         desc="Play/Pause player",
     ),
-    Key(['shift'], "Page_Up", lazy.spawn("playerctl next"), desc="Skip to next"),
-    Key(['shift'], "Page_Down", lazy.spawn("playerctl previous"), desc="Skip to previous"),
-    Key([], "XF86MonBrightnessDown", lazy.spawn("sudo brillo -q -u 200000 -U 5%"), desc="Lower Brightness by 5%"),
-    Key([], "XF86MonBrightnessUp", lazy.spawn("sudo brillo -q -u 200000 -A 5%"), desc="Raise Brightness by 5%"), 
-    Key([], "Print", lazy.spawn("/home/danielwee/.config/qtile/screenshotter.sh full")),
+    Key(['shift'], "Page_Up", lazy.function(media.next_track), desc="Skip to next"),
+    Key(['shift'], "Page_Down", lazy.function(media.previous_track), desc="Skip to previous"),
+    Key([], "XF86MonBrightnessDown", lazy.function(backlight.lower_brightness), desc="Lower Brightness by 5%"),
+    Key([], "XF86MonBrightnessUp", lazy.function(backlight.raise_brightness), desc="Raise Brightness by 5%"), 
+    Key([], "Print", lazy.function(screenshot.take, "full"), desc="Screenshot to clipboard"),
     Key(
         ["control"],
         "Print",
-        lazy.spawn("/home/danielwee/.config/qtile/screenshotter.sh screen"),
+        lazy.function(screenshot.take, "screen"),
+        desc="Screenshot current screen to clipboard",
+    ),
+    Key(
+        ["shift"],
+        "Print",
+        lazy.function(screenshot.take, "window"),
+        desc="Screenshot current window to clipboard",
     ),
 ]
 
@@ -294,24 +344,13 @@ layouts = [
     # layout.Zoomy(),
 ]
 
-from Xlib import display as xdisplay
 from libqtile.utils import send_notification
 
 
 def get_num_monitors():
     try:
-        # Run xrandr command with --listmonitors option
-        result = subprocess.run(['xrandr', '--listmonitors'], stdout=subprocess.PIPE, text=True, check=True)
-        output = result.stdout
-        
-        # Extract the number of monitors from the output
-        lines = output.splitlines()
-        if lines:
-            # The first line contains the number of monitors
-            num_monitors = int(lines[0].split()[1])
-        else:
-            # Default to 1 if the output is unexpected
-            num_monitors = 1
+        # Ask RandR directly; the answer is cached until the configuration changes
+        num_monitors = len(monitors.get_monitors()) or 1
     except Exception as e:
         # Handle any exceptions by setting a default number of monitors
         print(f"Error: {e}")
@@ -343,7 +382,7 @@ BLUE_950 = "172554"
 
 
 def separator():
-    return widget.Sep(
+    return damage.Sep(
         linewidth=1,
         padding=8,
         foreground="#3b4261",
@@ -351,13 +390,31 @@ def separator():
 
 
 def rect_decor():
-    return RectDecoration(colour="#1f2335", radius=8, filled=True, padding_y=2)
+    return damage.RectDecoration(colour="#1f2335", radius=8, filled=True, padding_y=2)
+
+
+monitor_labels = {}
+
+
+def monitor_label(monitor_num):
+    # Kept around so the text can follow hotplugs without rebuilding the bar
+    label = damage.TextBox(
+        text=f"Monitor {monitor_num}/{num_monitors}",
+        font="Fira Code",
+        fontsize=14,
+        padding=10,
+        decorations=[
+            rect_decor(),
+        ],
+    )
+    monitor_labels[monitor_num] = label
+    return label
 
 
 def primary_top_bar():
-    return bar.Bar(
+    return damage.Bar(
         [
-            widget.WidgetBox(
+            visibility.WidgetBox(
                 text_closed='[>]',
                 text_open='[<]',
                 widgets=[
@@ -377,17 +434,9 @@ def primary_top_bar():
                 ]
             ),
             separator(),
-            widget.TextBox(
-                text=f"Monitor 1/{num_monitors}",
-                font="Fira Code",
-                fontsize=14,
-                padding=10,
-                decorations=[
-                    rect_decor(),
-                ],
-            ),
+            monitor_label(1),
             separator(),
-            widget.WindowName(
+            titles.WindowName(
                 font="Fira Code",
                 fontsize=14,
                 padding=10,
@@ -396,7 +445,7 @@ def primary_top_bar():
                 ],
             ),
             separator(),
-            widget.Clock(
+            ticker.Clock(
                 format="%Y-%m-%d %a %I:%M %p",
                 font="Fira Code",
                 fontsize=14,
@@ -413,7 +462,7 @@ def primary_top_bar():
                 ],
             ),
             separator(),
-            widget.Battery(
+            metrics.Battery(
                 format="{percent:2.0%} {hour:d}:{min:02d}",
                 font="Fira Code",
                 fontsize=14,
@@ -423,7 +472,7 @@ def primary_top_bar():
                 ],
             ),
             separator(),
-            widget.CPU(
+            metrics.CPU(
                 format="CPU: {load_percent}%",
                 font="Fira Code",
                 fontsize=14,
@@ -432,7 +481,7 @@ def primary_top_bar():
                     rect_decor(),
                 ],
             ),
-            widget.Memory(
+            metrics.Memory(
                 format="RAM: {MemUsed:.0f}M/{MemTotal:.0f}M",
                 font="Fira Code",
                 fontsize=14,
@@ -441,7 +490,7 @@ def primary_top_bar():
                     rect_decor(),
                 ],
             ),
-            widget.Memory(
+            metrics.Memory(
                 format="Swap: {SwapUsed:.0f}M/{SwapTotal:.0f}M",
                 font="Fira Code",
                 fontsize=14,
@@ -451,8 +500,8 @@ def primary_top_bar():
                 ],
             ),
             separator(),
-            widget.WidgetBox(widgets=[
-                widget.DF(
+            visibility.WidgetBox(widgets=[
+                metrics.DF(
                     partition="/",
                     format="/: {uf}{m} ({r:.0f}%)",
                     visible_on_warn=False,
@@ -463,7 +512,7 @@ def primary_top_bar():
                         rect_decor(),
                     ],
                 ),
-                widget.DF(
+                metrics.DF(
                     partition="/home",
                     format="/home: {uf}{m} ({r:.0f}%)",
                     visible_on_warn=False,
@@ -476,7 +525,7 @@ def primary_top_bar():
                 ),
             ]),
             separator(),
-            widget.Volume(
+            audio.Volume(
                 font="Fira Code",
                 fontsize=14,
                 padding=10,
@@ -484,7 +533,7 @@ def primary_top_bar():
                     rect_decor(),
                 ],
             ),
-            # widget.Backlight(
+            # backlight.Backlight(
             #     font="Fira Code",
             #     fontsize=14,
             #     padding=10,
@@ -493,7 +542,7 @@ def primary_top_bar():
             #     ],
             # ),
             separator(),
-            widget.TextBox(
+            damage.TextBox(
                 text="Logout",
                 fontsize=14,
                 padding=10,
@@ -502,7 +551,7 @@ def primary_top_bar():
                     rect_decor(),
                 ],
             ),
-            widget.TextBox(
+            damage.TextBox(
                 text="Shutdown",
                 fontsize=14,
                 padding=10,
@@ -511,7 +560,7 @@ def primary_top_bar():
                     rect_decor(),
                 ],
             ),
-            widget.CheckUpdates(
+            updates.CheckUpdates(
                 font="Fira Code",
                 fontsize=14,
                 padding=10,
@@ -530,9 +579,9 @@ def primary_top_bar():
     )
 
 def secondary_top_bar(monitor_num):
-    return bar.Bar(
+    return damage.Bar(
         [
-            widget.WidgetBox(
+            visibility.WidgetBox(
                 text_closed='[>]',
                 text_open='[<]',
                 widgets=[
@@ -552,17 +601,9 @@ def secondary_top_bar(monitor_num):
                 ]
             ),
             separator(),
-            widget.TextBox(
-                text=f"Monitor {monitor_num}/{num_monitors}",
-                font="Fira Code",
-                fontsize=14,
-                padding=10,
-                decorations=[
-                    rect_decor(),
-                ],
-            ),
+            monitor_label(monitor_num),
             separator(),
-            widget.WindowName(
+            titles.WindowName(
                 font="Fira Code",
                 fontsize=14,
                 padding=10,
@@ -571,7 +612,7 @@ def secondary_top_bar(monitor_num):
                 ],
             ),
             separator(),
-            widget.Clock(
+            ticker.Clock(
                 format="%Y-%m-%d %a %I:%M %p",
                 font="Fira Code",
                 fontsize=14,
@@ -581,7 +622,7 @@ def secondary_top_bar(monitor_num):
                 ],
             ),
             separator(),
-            widget.Battery(
+            metrics.Battery(
                 format="{percent:2.0%} {hour:d}:{min:02d}",
                 font="Fira Code",
                 fontsize=14,
@@ -591,7 +632,7 @@ def secondary_top_bar(monitor_num):
                 ],
             ),
             separator(),
-            widget.CPU(
+            metrics.CPU(
                 format="CPU: {load_percent}%",
                 font="Fira Code",
                 fontsize=14,
@@ -600,7 +641,7 @@ def secondary_top_bar(monitor_num):
                     rect_decor(),
                 ],
             ),
-            widget.Memory(
+            metrics.Memory(
                 format="RAM: {MemUsed:.0f}M/{MemTotal:.0f}M",
                 font="Fira Code",
                 fontsize=14,
@@ -609,7 +650,7 @@ def secondary_top_bar(monitor_num):
                     rect_decor(),
                 ],
             ),
-            widget.Memory(
+            metrics.Memory(
                 format="Swap: {SwapUsed:.0f}M/{SwapTotal:.0f}M",
                 font="Fira Code",
                 fontsize=14,
@@ -619,8 +660,8 @@ def secondary_top_bar(monitor_num):
                 ],
             ),
             separator(),
-            widget.WidgetBox(widgets=[
-                widget.DF(
+            visibility.WidgetBox(widgets=[
+                metrics.DF(
                     partition="/",
                     format="/: {uf}{m} ({r:.0f}%)",
                     visible_on_warn=False,
@@ -631,7 +672,7 @@ def secondary_top_bar(monitor_num):
                         rect_decor(),
                     ],
                 ),
-                widget.DF(
+                metrics.DF(
                     partition="/home",
                     format="/home: {uf}{m} ({r:.0f}%)",
                     visible_on_warn=False,
@@ -644,7 +685,7 @@ def secondary_top_bar(monitor_num):
                 ),
             ]),
             separator(),
-            widget.Volume(
+            audio.Volume(
                 font="Fira Code",
                 fontsize=14,
                 padding=10,
@@ -652,7 +693,7 @@ def secondary_top_bar(monitor_num):
                     rect_decor(),
                 ],
             ),
-            # widget.Backlight(
+            # backlight.Backlight(
             #     font="Fira Code",
             #     fontsize=14,
             #     padding=10,
@@ -661,7 +702,7 @@ def secondary_top_bar(monitor_num):
             #     ],
             # ),
             separator(),
-            widget.TextBox(
+            damage.TextBox(
                 text="Logout",
                 fontsize=14,
                 padding=10,
@@ -670,7 +711,7 @@ def secondary_top_bar(monitor_num):
                     rect_decor(),
                 ],
             ),
-            widget.TextBox(
+            damage.TextBox(
                 text="Shutdown",
                 fontsize=14,
                 padding=10,
@@ -687,28 +728,42 @@ def secondary_top_bar(monitor_num):
         margin=[10, 10, 0, 10],  # Add margin
     )
 
-screens = [
-Screen(
-    wallpaper="/home/danielwee/Pictures/Wallpapers/epic-jigglypuff-hd-wallpaper.jpg",
-    wallpaper_mode="fill",
-    top=primary_top_bar(),
-),
-]
 
+def make_screen(index):
+    return wallpaper.Screen(
+        wallpaper="/home/danielwee/Pictures/Wallpapers/epic-jigglypuff-hd-wallpaper.jpg",
+        wallpaper_mode="fill",
+        top=primary_top_bar() if index == 0 else secondary_top_bar(index + 1),
+    )
 
-if num_monitors > 1:
-    for m in range(num_monitors - 1):
-        screens.append(
-            Screen(
-                wallpaper="/home/danielwee/Pictures/Wallpapers/epic-jigglypuff-hd-wallpaper.jpg",
-                wallpaper_mode="fill",
-                top=secondary_top_bar(m+2),
-            ),
-        )
 
-@hook.subscribe.screen_change
-def restart_on_randr(_):
-    qtile.reload_config()
+screens = [make_screen(i) for i in range(num_monitors)]
+
+# Only build/drop the screens that changed on hotplug instead of reloading
+# the whole config for every RandR event
+reconciler = reconcile.ScreenReconciler(make_screen)
+hook.subscribe.screen_change(reconciler.schedule)
+
+
+# Pause polling widgets hidden in a closed WidgetBox or behind a fullscreen window
+for subscribe in (
+    hook.subscribe.float_change,
+    hook.subscribe.client_killed,
+    hook.subscribe.setgroup,
+    hook.subscribe.layout_change,
+    hook.subscribe.screens_reconfigured,
+):
+    subscribe(visibility.refresh)
+
+
+@hook.subscribe.screens_reconfigured
+def update_monitor_labels():
+    for monitor_num, label in list(monitor_labels.items()):
+        if monitor_num > len(qtile.screens):
+            del monitor_labels[monitor_num]
+        else:
+            label.update(f"Monitor {monitor_num}/{len(qtile.screens)}")
+
 
 # Drag floating layouts.
 mouse = [
@@ -726,11 +781,11 @@ mouse = [
 
 dgroups_key_binder = None
 dgroups_app_rules = []  # type: list
-follow_mouse_focus = True
+follow_mouse_focus = False  # focus.py does it once the pointer settles
 bring_front_click = False
 floats_kept_above = True
 cursor_warp = False
-floating_layout = layout.Floating(
+floating_layout = floatrules.Floating(
     float_rules=[
         # Run the utility of `xprop` to see the wm class and name of an X client.
         *layout.Floating.default_float_rules,
@@ -744,7 +799,7 @@ floating_layout = layout.Floating(
 )
 auto_fullscreen = True
 focus_on_window_activation = "smart"
-reconfigure_screens = True
+reconfigure_screens = False  # handled by the reconciler above
 
 # If things like steam games want to auto-minimize themselves when losing
 # focus, should we respect this or not?
@@ -774,141 +829,60 @@ def autostart():
     subprocess.Popen([as_script])
 
 
-'''
 # Persistence
-import json
-import psutil
-import os
-
-from libqtile import hook, qtile
-from libqtile.backend.base import Window
-from libqtile.log_utils import logger
-
-CONFIG_PATH = os.path.expanduser("~/.config/qtile/")
-
-excluded_apps = ["plank"]
-
-
-class Session:
-    def __init__(self):
-        self.apps: list[dict[int, str]] = []
-        self.save_path = os.path.join(CONFIG_PATH, "json", "session.json")
-        if not os.path.exists(self.save_path):
-            self.from_windows()
-        else:
-            self.restore()
-
-    def add_app(self, wid: int, exe: str):
-        if not (
-            any(app["wid"] == wid for app in self.apps)
-            or any(i in exe for i in excluded_apps)
-            or qtile.windows_map[wid].group.name == "scratchpad"
-        ):
-            logger.info("Adding %s to session", exe)
-            self.apps.append({"wid": wid, "exe": exe})
-        else:
-            logger.info("NOT adding excluded app %s to session", exe)
-        self.log()
-
-    def remove_app(self, wid: int):
-        for i in range(len(self.apps)):
-            if self.apps[i]["wid"] == wid:
-                exe = next((app["exe"] for app in self.apps if app["wid"] == wid), None)
-                logger.info("Removing %s from session", exe)
-                del self.apps[i]
-                break
-        self.log()
-
-    def save(self):
-        with open(self.save_path, "w") as f:
-            json.dump(self.apps, f)
-        apps = [app["exe"] for app in self.apps]
-        logger.info("Saving session with apps: %s", ",".join(apps))
-
-    def restore(self):
-        with open(self.save_path, "r") as f:
-            self.apps = json.load(f)
-
-    def clear(self):
-        self.log()
-        logger.info("Clearing session")
-        self.apps = []
-        self.log()
-
-    def from_windows(self):
-        self.log()
-        logger.info("Setting sessio@hook.subscribe.screen_change
-def restart_on_randr(_):n from current windows")
-        windows = qtile.windows()
-        if windows:
-            for window in windows:
-                wid = window["id"]
-                exe = psutil.Process(int(qtile.windows_map[wid].get_pid())).exe()
-                self.add_app(
-                    wid=wid,
-                    exe=exe,
-                )
-        self.log()
-
-    def log(self):
-        logger.info("Session: %s", @hook.subscribe.screen_change
-def restart_on_randr(_):self.apps)
-
-
-@hook.subscribe.startup_once
-def setup_session():
-    global session
-    session = Session()
 
 
 @hook.subscribe.startup_once
 def restore_session():
-    if "session" in globals():
-        apps = [app["exe"] for app in session.apps]
-        logger.info("Restoring session with apps: %s", ",".join(apps))
-        for app in apps:
-            qtile.spawn(app)
+    slots = session.start()
+    restore.restore(slots, on_settled=session.session.settle)
 
 
 @hook.subscribe.client_managed
-def add_app_to_session(client: Window):
-    if "session" in globals():
-        wid = client.info()["id"]
-        exe = psutil.Process(client.window.get_net_wm_pid()).exe()
-        session.add_app(wid, exe)
+def add_app_to_session(client):
+    if session.session is not None:
+        session.session.add_app(client)
 
 
 @hook.subscribe.client_killed
-def remove_app_from_session(client: Window):
-    if "session" in globals():
-        wid = client.info()["id"]
-        session.remove_app(wid)
+def remove_app_from_session(client):
+    if session.session is not None:
+        session.session.remove_app(client.wid)
+
+
+@hook.subscribe.group_window_add
+def move_app_in_session(group, client):
+    if session.session is not None:
+        session.session.capture(client)
+
+
+@hook.subscribe.float_change
+def float_app_in_session():
+    if session.session is not None and qtile.current_window is not None:
+        session.session.capture(qtile.current_window)
 
 
 @hook.subscribe.shutdown
 @hook.subscribe.user("save_session")
 def save_session():
-    if "session" in globals():
-        session.save()
+    if session.session is not None:
+        session.session.save()
 
 
-@hook.subscribe.user("get_session"@hook.subscribe.screen_change
-def restart_on_randr(_):)
+@hook.subscribe.user("get_session")
 def log_session():
-    if "session" in globals():
-        session.log()
+    if session.session is not None:
+        session.session.log()
 
 
 @hook.subscribe.user("set_session")
 def set_session():
-    if "session" in globals():
-        session.from_windows()
+    if session.session is not None:
+        session.session.from_windows()
 
 
 @hook.subscribe.user("clear_session")
 def clear_session():
-    if "session" in globals():
-        session.clear()
-        if os.path.exists(session.save_path):
-            os.remove(session.save_path)
-'''
+    if session.session is not None:
+        session.session.clear()
+        session.session.compact()
@@ -0,0 +1,148 @@
+"""
+Damage-tracked bar drawing.
+
+A bar redraw normally repaints every widget and every RectDecoration on it,
+even if only one clock digit changed. Here each widget remembers what it
+last put on screen and skips the paint when nothing that affects its pixels
+changed. A widget still repaints when the bar layout shifts (a widget
+resized or a WidgetBox toggled) and when the bar window is exposed.
+Rounded-rect decorations are rendered once per (size, colour, radius) and
+then just composited.
+"""
+
+from collections import OrderedDict
+
+import cairocffi
+from libqtile import bar
+from qtile_extras import widget
+from qtile_extras.widget import decorations
+
+
+class Bar(bar.Bar):
+    def __init__(self, widgets, size, **config):
+        super().__init__(widgets, size, **config)
+        self.draws = 0
+        self.skipped_draws = 0
+        self.full_redraw = True
+        self._layout_key = None
+
+    def _configure(self, qtile, screen, reconfigure=False):
+        super()._configure(qtile, screen, reconfigure=reconfigure)
+        self.full_redraw = True
+        if self.window is not None:
+            self.window.process_window_expose = self.expose
+
+    def expose(self):
+        # Window contents are gone, nothing on screen can be trusted
+        self.full_redraw = True
+        self.draw()
+
+    def _resize(self, length, widgets):
+        super()._resize(length, widgets)
+        layout_key = tuple((id(w), w.offsetx, w.offsety, w.length) for w in widgets)
+        if layout_key != self._layout_key:
+            self._layout_key = layout_key
+            self.full_redraw = True
+
+    def _actual_draw(self):
+        super()._actual_draw()
+        self.full_redraw = False
+
+    def damage_stats(self):
+        return {"draws": self.draws, "skipped": self.skipped_draws}
+
+
+class DamageMixin:
+    """Skip draw() when the widget would paint exactly what is already there."""
+
+    _drawn = None
+
+    def damage_key(self):
+        layout = getattr(self, "layout", None)
+        return (
+            self.offsetx,
+            self.offsety,
+            self.length,
+            self.background,
+            getattr(self, "foreground", None),
+            getattr(self, "text", None),
+            getattr(self, "_scroll_offset", None),
+            getattr(layout, "colour", None),
+        )
+
+    def draw(self):
+        key = self.damage_key()
+        tracked = isinstance(self.bar, Bar)
+        if tracked and not self.bar.full_redraw and key == self._drawn:
+            self.bar.skipped_draws += 1
+            return
+        super().draw()
+        self._drawn = key
+        if tracked:
+            self.bar.draws += 1
+
+
+_SURFACE_CACHE_SIZE = 64
+
+if "_surfaces" not in globals():
+    _surfaces = OrderedDict()
+
+
+class RectDecoration(decorations.RectDecoration):
+    """RectDecoration that paints from a pre-rendered surface when it can."""
+
+    _render_ctx = None
+
+    @property
+    def ctx(self):
+        return self._render_ctx or self.drawer.ctx
+
+    def _surface_key(self):
+        return (
+            self.width,
+            self.height,
+            self.colour,
+            tuple(self.corners),
+            self.padding_x,
+            self.padding_y,
+            self.filled,
+            self.line_width,
+            self.line_colour,
+        )
+
+    def draw(self):
+        # Grouped, clipping and widget-coloured decorations depend on more
+        # than their own geometry; leave those to the stock drawing code
+        if self.group or self.clip or self.use_widget_background:
+            return super().draw()
+
+        key = self._surface_key()
+        surface = _surfaces.get(key)
+        if surface is None:
+            surface = cairocffi.ImageSurface(
+                cairocffi.FORMAT_ARGB32, max(self.width, 1), max(self.height, 1)
+            )
+            self._render_ctx = cairocffi.Context(surface)
+            try:
+                super().draw()
+            finally:
+                self._render_ctx = None
+            _surfaces[key] = surface
+            if len(_surfaces) > _SURFACE_CACHE_SIZE:
+                _surfaces.popitem(last=False)
+        else:
+            _surfaces.move_to_end(key)
+
+        ctx = self.drawer.ctx
+        ctx.reset_clip()
+        ctx.set_source_surface(surface, 0, 0)
+        ctx.paint()
+        ctx.new_path()
+
+
+class TextBox(DamageMixin, widget.TextBox):
+    pass
+
+
+class Sep(DamageMixin, widget.Sep):
+    pass
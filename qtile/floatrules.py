@@ -0,0 +1,220 @@
+"""
+Float rules compiled into lookups instead of a list walk.
+
+layout.Floating tries every Match in turn for each new window, and each
+Match asks X for the window's properties all over again. Here the rules
+are sorted once at config load: single exact wm_class / instance / title
+/ wm_type / role rules go into sets, single regex rules on those
+properties are merged into one alternation per property (those with
+inline flags or groups are tried on their own), and anything
+else (several properties, func, pid, wid) is kept as a Match and tried
+last. A window's properties are fetched at most once per check and
+shared by every rule, so exact matches cost the same with ten rules or
+a thousand.
+"""
+
+import re
+
+from libqtile import layout
+
+try:
+    import xcffib.xproto
+
+    # A window destroyed while its rules are checked, as Window.match allows for
+    _GONE = (xcffib.xproto.WindowError, xcffib.xproto.AccessError)
+except ImportError:
+    _GONE = ()
+
+# Match property -> name of the window method that reads it
+_GETTERS = {
+    "wm_class": "get_wm_class",
+    "role": "get_wm_role",
+    "wm_type": "get_wm_type",
+    "net_wm_pid": "get_pid",
+}
+_INDEXED = ("wm_class", "wm_instance_class", "title", "wm_type", "role")
+
+
+class WindowProps:
+    """Reads each window property at most once and otherwise passes through."""
+
+    def __init__(self, window):
+        self._window = window
+        self._cache = {}
+
+    def _get(self, getter):
+        if getter not in self._cache:
+            self._cache[getter] = getattr(self._window, getter)()
+        return self._cache[getter]
+
+    def get_wm_class(self):
+        return self._get("get_wm_class")
+
+    def get_wm_role(self):
+        return self._get("get_wm_role")
+
+    def get_wm_type(self):
+        return self._get("get_wm_type")
+
+    def get_pid(self):
+        return self._get("get_pid")
+
+    @property
+    def name(self):
+        if "name" not in self._cache:
+            self._cache["name"] = self._window.name
+        return self._cache["name"]
+
+    def __getattr__(self, attr):
+        return getattr(self._window, attr)
+
+
+_GLOBAL_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+def _combinable(pattern):
+    # Global inline flags must start the whole expression, and group numbers
+    # (backreferences) would shift once other patterns are put in front
+    return not pattern.groups and not _GLOBAL_FLAGS.search(pattern.pattern)
+
+
+class RuleMatcher:
+    def __init__(self, rules):
+        self.exact = {prop: set() for prop in _INDEXED}
+        patterns = {prop: [] for prop in _INDEXED}
+        self.fallback = []
+        for rule in rules:
+            items = list(getattr(rule, "_rules", {}).items())
+            if len(items) == 1 and items[0][0] in _INDEXED:
+                prop, value = items[0]
+                if isinstance(value, str):
+                    self.exact[prop].add(value)
+                    continue
+                if isinstance(value, re.Pattern) and isinstance(value.pattern, str):
+                    patterns[prop].append(value)
+                    continue
+            self.fallback.append(rule)
+        # prop -> list of combined regexes, one per distinct set of flags,
+        # followed by the patterns that can't be combined
+        self.regex = {}
+        for prop, compiled in patterns.items():
+            by_flags = {}
+            alone = []
+            for pattern in compiled:
+                if _combinable(pattern):
+                    by_flags.setdefault(pattern.flags, []).append(f"(?:{pattern.pattern})")
+                else:
+                    alone.append(pattern)
+            regexes = [re.compile("|".join(parts), flags) for flags, parts in by_flags.items()]
+            if regexes or alone:
+                self.regex[prop] = regexes + alone
+
+    def _values(self, props, prop):
+        if prop == "title":
+            value = props.name
+            return [value] if value is not None else []
+        if prop in ("wm_class", "wm_instance_class"):
+            wm_class = props.get_wm_class() or []
+            return wm_class if prop == "wm_class" else wm_class[:1]
+        value = props.get_wm_role() if prop == "role" else props.get_wm_type()
+        return [value] if value is not None else []
+
+    def match(self, window):
+        try:
+            return self._match(window)
+        except _GONE:
+            return False
+
+    def _match(self, window):
+        props = WindowProps(window)
+        for prop in _INDEXED:
+            exact, regexes = self.exact[prop], self.regex.get(prop)
+            if not exact and not regexes:
+                continue
+            values = self._values(props, prop)
+            if not exact.isdisjoint(values):
+                return True
+            if regexes and any(r.match(v) for r in regexes for v in values):
+                return True
+        return any(rule.compare(props) for rule in self.fallback)
+
+    def __len__(self):
+        return (
+            sum(len(s) for s in self.exact.values())
+            + sum(len(r) for r in self.regex.values())
+            + len(self.fallback)
+        )
+
+
+class Floating(layout.Floating):
+    def __init__(self, float_rules=None, **config):
+        super().__init__(float_rules=float_rules, **config)
+        self.matcher = RuleMatcher(self.float_rules)
+
+    def match(self, win):
+        return self.matcher.match(win)
+
+
+if __name__ == "__main__":
+    import sys
+    import timeit
+
+    from libqtile.config import Match
+
+    class FakeWindow:
+        """Counts property reads the way an X round trip would cost."""
+
+        reads = 0
+
+        def __init__(self, wm_class, title):
+            self._wm_class = wm_class
+            self._title = title
+            self.wid = 1
+
+        @property
+        def name(self):
+            FakeWindow.reads += 1
+            return self._title
+
+        def get_wm_class(self):
+            FakeWindow.reads += 1
+            return self._wm_class
+
+        def get_wm_type(self):
+            FakeWindow.reads += 1
+            return "normal"
+
+        def get_wm_role(self):
+            FakeWindow.reads += 1
+            return None
+
+        def get_pid(self):
+            FakeWindow.reads += 1
+            return 1
+
+        def has_fixed_size(self):
+            return False
+
+        def has_fixed_ratio(self):
+            return False
+
+    window = FakeWindow(["kitty", "kitty"], "~")
+    number = int(sys.argv[1]) if sys.argv[1:] else 2000
+    print(f"{'rules':>6} {'list us':>9} {'compiled us':>12} {'reads':>6} {'reads':>6}")
+    for count in (16, 64, 256, 1024):
+        rules = list(layout.Floating.default_float_rules)
+        rules += [Match(wm_class=f"app{i}") for i in range(count // 2)]
+        rules += [Match(title=f"dialog {i}") for i in range(count // 4)]
+        rules += [Match(title=re.compile(f"^Save {i}")) for i in range(count // 4)]
+        matcher = RuleMatcher(rules)
+
+        FakeWindow.reads = 0
+        walk = timeit.timeit(lambda: any(r.compare(window) for r in rules), number=number)
+        walk_reads = FakeWindow.reads // number
+        FakeWindow.reads = 0
+        compiled = timeit.timeit(lambda: matcher.match(window), number=number)
+        compiled_reads = FakeWindow.reads // number
+        print(
+            f"{len(rules):>6} {walk / number * 1e6:>9.1f} {compiled / number * 1e6:>12.1f}"
+            f" {walk_reads:>6} {compiled_reads:>6}"
+        )
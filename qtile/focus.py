@@ -0,0 +1,81 @@
+"""
+Focus follows the mouse, but only where the pointer comes to rest.
+
+With qtile's own follow_mouse_focus every window boundary the pointer
+crosses is a focus change: borders get repainted, every WindowName
+widget updates and the focus hooks fire, all for windows only passed
+over. Here an enter just (re)arms a short dwell timer and focus moves
+once the pointer has stayed on a window that long. Clicks still focus
+immediately (qtile does that itself), as does the keyboard, which also
+cancels any pending hover focus.
+
+Set follow_mouse_focus = False in config.py so the two don't race.
+"""
+
+from libqtile import qtile
+
+# Seconds the pointer must rest on a window before it takes focus
+DWELL = 0.08
+
+
+class FocusCoalescer:
+    def __init__(self, dwell=DWELL):
+        self.dwell = dwell
+        self._target = None
+        self._handle = None
+        self._settling = False
+        self.enters = 0
+        self.suppressed = 0
+        self.settled = 0
+
+    def on_enter(self, window):
+        self.enters += 1
+        if self._handle is not None:
+            # The previous window was only passed over
+            self._handle.cancel()
+            self.suppressed += 1
+        if window.group is None or window is qtile.current_window:
+            self._target = self._handle = None
+            return
+        self._target = window
+        self._handle = qtile.call_later(self.dwell, self._settle)
+
+    def on_focus(self, window):
+        # Clicks and key bindings win over a pending hover
+        if not self._settling and self._handle is not None:
+            self._handle.cancel()
+            self._target = self._handle = None
+
+    def _settle(self):
+        window, self._target, self._handle = self._target, None, None
+        group = window.group
+        if group is None or window.wid not in qtile.windows_map:
+            return
+        # The pointer may have left for a bar or the root window since
+        x, y = qtile.core.get_mouse_position()
+        if not (
+            window.x <= x < window.x + window.width
+            and window.y <= y < window.y + window.height
+        ):
+            self.suppressed += 1
+            return
+        self.settled += 1
+        self._settling = True
+        try:
+            if group.current_window is not window:
+                group.focus(window, False)
+            if group.screen and qtile.current_screen is not group.screen:
+                qtile.focus_screen(group.screen.index, False)
+        finally:
+            self._settling = False
+
+    def stats(self):
+        return {
+            "enters": self.enters,
+            "suppressed": self.suppressed,
+            "settled": self.settled,
+        }
+
+
+if "coalescer" not in globals():
+    coalescer = FocusCoalescer()
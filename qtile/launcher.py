@@ -0,0 +1,475 @@
+"""
+Application launcher backed by a persistent index.
+
+`rofi -show drun` walked and parsed every .desktop file under
+XDG_DATA_DIRS each time it opened, and every app key went through a PATH
+lookup on each press. Here the desktop entries are parsed once, saved to
+~/.cache/qtile/launcher.json and reparsed only when a file's mtime
+changes. While qtile runs, inotify on the application and PATH
+directories keeps the entries and the resolved executables current.
+The menu is rofi in dmenu mode, given the rows already sorted by
+frecency (how often and how recently an entry was launched). The app keys
+spawn through the same index and count towards the ranking.
+"""
+
+import asyncio
+import ctypes
+import json
+import os
+import shlex
+import shutil
+import struct
+import tempfile
+import time
+
+from libqtile.log_utils import logger
+from libqtile.utils import create_task, guess_terminal
+
+CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "qtile",
+    "launcher.json",
+)
+FRECENCY_FILE = os.path.expanduser("~/.config/qtile/json/frecency.json")
+CACHE_VERSION = 1
+
+# Seconds to wait after a change before rewriting the cache
+SAVE_DELAY = 2
+
+# (age in days, weight) buckets for the frecency score
+FRECENCY_WEIGHTS = ((4, 100), (14, 70), (31, 50), (90, 30))
+FRECENCY_OLD = 10
+
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+APP_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+PATH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB
+
+# Desktop entry field codes that expand to nothing here
+_FIELD_CODES = {"%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%v", "%m", "%k", "%i"}
+
+
+def application_dirs():
+    """XDG application dirs, highest precedence first."""
+    data_home = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    dirs = [data_home, *data_dirs.split(":")]
+    return list(dict.fromkeys(os.path.join(d, "applications") for d in dirs if d))
+
+
+def exec_argv(value, name=""):
+    """Split an Exec= value into argv, dropping field codes."""
+    argv = []
+    for arg in shlex.split(value.replace("\\\\", "\\")):
+        if arg in _FIELD_CODES:
+            continue
+        if arg == "%c":
+            arg = name
+        argv.append(arg.replace("%%", "%"))
+    return argv
+
+
+def parse_entry(path):
+    """The launchable fields of a .desktop file, or None if it isn't one."""
+    fields = {}
+    section = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("["):
+                if section == "Desktop Entry":
+                    break
+                section = line[1:-1]
+            elif section == "Desktop Entry" and "=" in line and not line.startswith("#"):
+                key, _, value = line.partition("=")
+                key = key.strip()
+                # Localised keys (Name[de]=...) are skipped
+                if "[" not in key:
+                    fields[key] = value.strip()
+    if fields.get("Type") != "Application" or "Exec" not in fields:
+        return None
+    if fields.get("NoDisplay") == "true" or fields.get("Hidden") == "true":
+        return None
+    name = fields.get("Name", os.path.basename(path))
+    try:
+        argv = exec_argv(fields["Exec"], name)
+    except ValueError:
+        return None
+    if not argv:
+        return None
+    keywords = [k for k in fields.get("Keywords", "").split(";") if k]
+    return {
+        "name": name,
+        "argv": argv,
+        "try_exec": fields.get("TryExec"),
+        "icon": fields.get("Icon"),
+        "terminal": fields.get("Terminal") == "true",
+        "keywords": keywords,
+    }
+
+
+class Inotify:
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+
+    def add(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Could not watch {path}")
+        self.paths[wd] = path
+        return wd
+
+    def read(self):
+        """Pending (directory, mask, name) events."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if wd in self.paths:
+                    events.append((self.paths[wd], mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LauncherIndex:
+    def __init__(self, dirs=None, cache_file=CACHE_FILE, frecency_file=FRECENCY_FILE):
+        self.dirs = application_dirs() if dirs is None else dirs
+        self.cache_file = cache_file
+        self.frecency_file = frecency_file
+        # applications dir -> {relative path: [mtime_ns, entry or None]}
+        self._files = {}
+        # desktop id -> entry, the first dir wins
+        self.entries = {}
+        # executable name -> absolute path or None
+        self._which = {}
+        # desktop id -> [launches, last launch time]
+        self.frecency = {}
+        self._inotify = None
+        self._save_handle = None
+        self.stats = {"parsed": 0, "reused": 0, "changes": 0, "menu_build": None}
+
+    def load(self):
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+            if cache.get("version") != CACHE_VERSION:
+                cache = {}
+        except (OSError, ValueError):
+            cache = {}
+        cached = cache.get("dirs", {})
+        for directory in self.dirs:
+            self._files[directory] = self._scan(directory, cached.get(directory, {}))
+        self._rebuild()
+        try:
+            with open(self.frecency_file) as f:
+                self.frecency = json.load(f)
+        except (OSError, ValueError):
+            self.frecency = {}
+        if self.stats["parsed"]:
+            self.save()
+
+    def _scan(self, directory, cached):
+        files = {}
+        for root, _, names in os.walk(directory):
+            for filename in names:
+                if not filename.endswith(".desktop"):
+                    continue
+                path = os.path.join(root, filename)
+                rel = os.path.relpath(path, directory)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                old = cached.get(rel)
+                if old is not None and old[0] == mtime:
+                    self.stats["reused"] += 1
+                    files[rel] = old
+                else:
+                    files[rel] = [mtime, self._parse(path)]
+        return files
+
+    def _parse(self, path):
+        self.stats["parsed"] += 1
+        try:
+            return parse_entry(path)
+        except OSError:
+            return None
+
+    def _rebuild(self):
+        entries = {}
+        for directory in self.dirs:
+            for rel, (_, entry) in self._files.get(directory, {}).items():
+                desktop_id = rel.replace(os.sep, "-")
+                # A hidden or broken entry in an earlier dir still masks later ones
+                if desktop_id not in entries:
+                    entries[desktop_id] = entry
+        self.entries = {k: v for k, v in entries.items() if v is not None}
+
+    def save(self):
+        self._save_handle = None
+        cache = {"version": CACHE_VERSION, "dirs": self._files}
+        _write_json(self.cache_file, cache)
+
+    def _save_later(self):
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(SAVE_DELAY, self.save)
+
+    def watch(self):
+        try:
+            self._inotify = Inotify()
+        except OSError:
+            logger.exception("No inotify, the launcher index is only refreshed at startup")
+            return
+        for directory in self.dirs:
+            for root, _, _ in os.walk(directory):
+                self._watch(root, APP_MASK)
+        for directory in dict.fromkeys(os.environ.get("PATH", "").split(":")):
+            if directory:
+                self._watch(directory, PATH_MASK)
+        asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_events)
+
+    def _watch(self, path, mask):
+        try:
+            self._inotify.add(path, mask)
+        except OSError:
+            pass
+
+    def stop(self):
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+
+    def _on_events(self):
+        changed = False
+        for path, mask, name in self._inotify.read():
+            directory = next(
+                (d for d in self.dirs if path == d or path.startswith(d + os.sep)), None
+            )
+            if directory is None:
+                # A PATH directory; look the name up again next time
+                self._which.pop(name, None)
+                continue
+            full = os.path.join(path, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch(full, APP_MASK)
+                continue
+            if not name.endswith(".desktop"):
+                continue
+            rel = os.path.relpath(full, directory)
+            files = self._files.setdefault(directory, {})
+            try:
+                files[rel] = [os.stat(full).st_mtime_ns, self._parse(full)]
+            except OSError:
+                files.pop(rel, None)
+            changed = True
+        if changed:
+            self.stats["changes"] += 1
+            self._rebuild()
+            self._save_later()
+
+    def resolve(self, name):
+        """Absolute path of an executable, remembered until PATH changes."""
+        if os.sep in name:
+            return name if os.access(name, os.X_OK) else None
+        if name not in self._which:
+            self._which[name] = shutil.which(name)
+        return self._which[name]
+
+    def available(self, entry):
+        return self.resolve(entry["try_exec"] or entry["argv"][0]) is not None
+
+    def score(self, desktop_id, now=None):
+        launches, last = self.frecency.get(desktop_id, (0, 0))
+        if not launches:
+            return 0
+        age = ((now or time.time()) - last) / 86400
+        weight = next((w for days, w in FRECENCY_WEIGHTS if age < days), FRECENCY_OLD)
+        return launches * weight
+
+    def ranked(self):
+        now = time.time()
+        return sorted(
+            ((k, e) for k, e in self.entries.items() if self.available(e)),
+            key=lambda item: (-self.score(item[0], now), item[1]["name"].lower()),
+        )
+
+    def record(self, desktop_id):
+        launches, _ = self.frecency.get(desktop_id, (0, 0))
+        self.frecency[desktop_id] = [launches + 1, time.time()]
+        try:
+            _write_json(self.frecency_file, self.frecency)
+        except OSError:
+            logger.exception("Could not save launcher frecency")
+
+    def find(self, command):
+        """Desktop id for a desktop id or executable name."""
+        if command in self.entries:
+            return command
+        if command + ".desktop" in self.entries:
+            return command + ".desktop"
+        for desktop_id, entry in self.entries.items():
+            if os.path.basename(entry["argv"][0]) == command:
+                return desktop_id
+        return None
+
+    def launch(self, qtile, desktop_id):
+        entry = self.entries.get(desktop_id)
+        if entry is None:
+            logger.warning("No desktop entry %s", desktop_id)
+            return
+        path = self.resolve(entry["argv"][0])
+        if path is None:
+            logger.error("Couldn't find `%s`", entry["argv"][0])
+            return
+        argv = [path, *entry["argv"][1:]]
+        if entry["terminal"]:
+            argv = [guess_terminal(), "-e", *argv]
+        qtile.spawn(argv)
+        self.record(desktop_id)
+
+    def run(self, qtile, command, *args, env=None):
+        """Spawn command from the resolved path; counts for its desktop entry."""
+        path = self.resolve(command)
+        if path is None:
+            logger.error("Couldn't find `%s`", command)
+            return
+        qtile.spawn([path, *args], env={**os.environ, **env} if env else {})
+        desktop_id = self.find(command)
+        if desktop_id is not None:
+            self.record(desktop_id)
+
+    def rows(self):
+        """(desktop ids, rofi dmenu input) in ranked order."""
+        start = time.perf_counter()
+        ids, lines = [], []
+        for desktop_id, entry in self.ranked():
+            ids.append(desktop_id)
+            line = entry["name"].replace("\n", " ")
+            meta = " ".join(entry["keywords"])
+            if entry["icon"]:
+                line += f"\0icon\x1f{entry['icon']}"
+                if meta:
+                    line += f"\x1fmeta\x1f{meta}"
+            elif meta:
+                line += f"\0meta\x1f{meta}"
+            lines.append(line)
+        data = ("\n".join(lines) + "\n").encode()
+        self.stats["menu_build"] = time.perf_counter() - start
+        return ids, data
+
+    async def menu(self, qtile):
+        ids, data = self.rows()
+        proc = await asyncio.create_subprocess_exec(
+            "rofi",
+            "-dmenu",
+            "-i",
+            "-show-icons",
+            "-p",
+            "Apps",
+            "-format",
+            "i",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        output, _ = await proc.communicate(data)
+        choice = output.decode().strip()
+        if proc.returncode == 0 and choice.isdigit() and int(choice) < len(ids):
+            self.launch(qtile, ids[int(choice)])
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+if "index" not in globals():
+    index = None
+
+
+def get_index():
+    global index
+    if index is None:
+        index = LauncherIndex()
+        index.load()
+        index.watch()
+    return index
+
+
+def menu(qtile):
+    create_task(get_index().menu(qtile))
+
+
+def run(qtile, command, *args, env=None):
+    get_index().run(qtile, command, *args, env=env)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Menu-open latency with a synthetic set of entries:
+    #   python launcher.py [count]
+    count = int(sys.argv[1]) if sys.argv[1:] else 1500
+    with tempfile.TemporaryDirectory() as tmp:
+        apps = os.path.join(tmp, "applications")
+        os.makedirs(apps)
+        for i in range(count):
+            with open(os.path.join(apps, f"app{i}.desktop"), "w") as f:
+                f.write(
+                    "[Desktop Entry]\nType=Application\n"
+                    f"Name=Application {i}\nName[de]=Anwendung {i}\n"
+                    f"Exec=sh -c 'true {i}' %U\nIcon=app{i}\nKeywords=test;app{i};\n"
+                    "[Desktop Action new]\nExec=sh --new\n"
+                )
+        cache = os.path.join(tmp, "launcher.json")
+        frecency = os.path.join(tmp, "frecency.json")
+
+        def timed(label, func):
+            start = time.perf_counter()
+            result = func()
+            print(f"{label:>22}: {(time.perf_counter() - start) * 1000:8.2f}ms")
+            return result
+
+        def rofi_scan():
+            # What drun did on every open: walk and parse everything
+            return [parse_entry(os.path.join(apps, n)) for n in os.listdir(apps)]
+
+        timed(f"parse all ({count})", rofi_scan)
+        cold = LauncherIndex([apps], cache, frecency)
+        timed("cold index", cold.load)
+        warm = LauncherIndex([apps], cache, frecency)
+        timed("index from cache", warm.load)
+        assert warm.stats["parsed"] == 0 and len(warm.entries) == count
+        for i in range(0, count, 7):
+            warm.frecency[f"app{i}.desktop"] = [i % 5 + 1, time.time() - i * 3600]
+        timed("menu open, first", warm.rows)
+        ids, _ = timed("menu open, warm", warm.rows)
+        print(f"{'top entry':>22}: {ids[0]}, cache {os.path.getsize(cache)} bytes")
@@ -0,0 +1,146 @@
+"""
+Carry layout and window state across reload_config.
+
+A reload builds fresh groups and layouts, so MonadTall ratios, secondary
+pane sizes, client order, each group's layout choice and floating
+geometry would all start over, and every window re-added to its group
+set off another relayout. The state is snapshotted by group name and wid
+while config.py is being re-read (the old groups still exist then), the
+new groups skip layout_all while windows are put back, and the snapshot
+is applied on startup so the single layout qtile does after a reload
+lands on the previous arrangement. Afterwards every window's geometry
+is compared against the snapshot and any drift is logged.
+"""
+
+from libqtile import qtile
+from libqtile.layout.base import _ClientList
+from libqtile.log_utils import logger
+from libqtile.scratchpad import ScratchPad
+
+# Per-layout attributes worth keeping, by layout name
+LAYOUT_ATTRS = {
+    "monadtall": ("ratio", "align", "relative_sizes"),
+    "monadwide": ("ratio", "align", "relative_sizes"),
+    "monadthreecol": ("ratio", "align", "relative_sizes"),
+    "tile": ("ratio", "master_length"),
+    "columns": ("columns",),
+}
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def freeze_layout(group):
+    """Make group.layout_all a no-op until thaw_layout()."""
+    group.layout_all = _noop
+
+
+def thaw_layout(group, relayout=True):
+    if group.__dict__.pop("layout_all", None) is not None and relayout:
+        group.layout_all()
+
+
+if "snapshot" not in globals():
+    # group name -> state, only between capture and apply
+    snapshot = None
+    stats = {"captured": 0, "applied": 0, "mismatched": 0}
+
+
+def _layout_state(layout):
+    state = {"name": layout.name}
+    for attr in LAYOUT_ATTRS.get(layout.name, ()):
+        if hasattr(layout, attr):
+            value = getattr(layout, attr)
+            state[attr] = list(value) if isinstance(value, list) else value
+    clients = getattr(layout, "clients", None)
+    if isinstance(clients, _ClientList):
+        state["order"] = [c.wid for c in clients]
+        state["current"] = clients.current_index
+    return state
+
+
+def capture():
+    """Snapshot every group; does nothing on the first load."""
+    global snapshot
+    if not getattr(qtile, "groups", None):
+        return
+    snapshot = {}
+    for group in qtile.groups:
+        if isinstance(group, ScratchPad):
+            # QtileState already carries scratchpads over
+            continue
+        snapshot[group.name] = {
+            "layout": group.current_layout,
+            "layouts": [_layout_state(layout) for layout in group.layouts],
+            "floating": [w.wid for w in group.windows if w.floating],
+            "geometry": {w.wid: (w.x, w.y, w.width, w.height) for w in group.windows},
+        }
+    stats["captured"] += 1
+
+
+def freeze(name):
+    """addgroup hook: hold off layouts for groups rebuilt by a reload."""
+    if snapshot is not None and name in snapshot and name in qtile.groups_map:
+        freeze_layout(qtile.groups_map[name])
+
+
+def _restore_layout(layout, state):
+    for attr in LAYOUT_ATTRS.get(layout.name, ()):
+        if attr in state:
+            setattr(layout, attr, state[attr])
+    clients = getattr(layout, "clients", None)
+    if isinstance(clients, _ClientList) and "order" in state:
+        rank = {wid: i for i, wid in enumerate(state["order"])}
+        # Windows the old layout didn't have keep their place at the end
+        clients.clients.sort(key=lambda c: rank.get(c.wid, len(rank)))
+        clients.current_index = state["current"]
+    if "relative_sizes" in state:
+        # Otherwise the windows just re-added would make it normalize
+        layout.do_normalize = len(state["relative_sizes"]) != len(layout.clients) - 1
+
+
+def apply():
+    """startup hook: put the snapshot back before qtile's post-reload layout."""
+    global snapshot
+    if snapshot is None:
+        return
+    state, snapshot = snapshot, None
+    for name, saved in state.items():
+        group = qtile.groups_map.get(name)
+        if group is None:
+            continue
+        for layout, layout_state in zip(group.layouts, saved["layouts"]):
+            if layout.name != layout_state["name"]:
+                # The layouts list itself was edited; start those afresh
+                continue
+            try:
+                _restore_layout(layout, layout_state)
+            except Exception:
+                logger.exception("Could not restore %s on group %s", layout.name, name)
+        index = saved["layout"]
+        if index != group.current_layout and index < len(group.layouts):
+            group.use_layout(index)
+        for w in group.windows:
+            if w.wid in saved["floating"]:
+                w.floating = True
+                w.x, w.y, w.width, w.height = saved["geometry"][w.wid]
+        # load_config lays out the visible groups right after this hook
+        thaw_layout(group, relayout=False)
+    stats["applied"] += 1
+    qtile.call_soon(_verify, state)
+
+
+def _verify(state):
+    moved = []
+    for name, saved in state.items():
+        group = qtile.groups_map.get(name)
+        if group is None or group.screen is None:
+            continue
+        for w in group.windows:
+            before = saved["geometry"].get(w.wid)
+            if before is not None and before != (w.x, w.y, w.width, w.height):
+                moved.append((w.name, before, (w.x, w.y, w.width, w.height)))
+    if moved:
+        stats["mismatched"] += 1
+        logger.warning("Windows moved across reload: %s", moved)
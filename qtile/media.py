@@ -0,0 +1,219 @@
+"""
+In-process MPRIS media control.
+
+The media keys used to spawn playerctl, which opens a fresh session bus
+connection per keypress. One connection is kept here instead. Players are
+tracked through NameOwnerChanged and PropertiesChanged signals, so a key
+press is a single method call on the cached active player, and
+now-playing metadata is pushed to subscribers (see NowPlaying) rather than
+polled.
+"""
+
+import asyncio
+from collections import OrderedDict
+
+from dbus_fast import Message, MessageType
+from dbus_fast.aio import MessageBus
+from dbus_fast.constants import BusType
+from libqtile.log_utils import logger
+from libqtile.utils import create_task
+from qtile_extras import widget
+
+from damage import DamageMixin
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+MATCH_RULES = [
+    "type='signal',interface='org.freedesktop.DBus',member='NameOwnerChanged',"
+    f"arg0namespace='{MPRIS_PREFIX[:-1]}'",
+    f"type='signal',interface='{PROPERTIES_INTERFACE}',member='PropertiesChanged',"
+    f"path='{MPRIS_PATH}'",
+]
+
+
+def _dbus_message(member, signature="", body=None):
+    return Message(
+        destination="org.freedesktop.DBus",
+        path="/org/freedesktop/DBus",
+        interface="org.freedesktop.DBus",
+        member=member,
+        signature=signature,
+        body=body or [],
+    )
+
+
+def _unwrap(props):
+    return {k: getattr(v, "value", v) for k, v in props.items()}
+
+
+class MprisController:
+    def __init__(self, bus_type=BusType.SESSION):
+        self.bus_type = bus_type
+        self.bus = None
+        self._lock = asyncio.Lock()
+        # well-known name -> {"owner", "status", "metadata"}, oldest first
+        self.players = OrderedDict()
+        self.callbacks = set()
+        self.calls = 0
+
+    async def connect(self):
+        async with self._lock:
+            if self.bus is not None and self.bus.connected:
+                return self.bus
+            self.bus = await MessageBus(bus_type=self.bus_type).connect()
+            self.bus.add_message_handler(self._on_message)
+            for rule in MATCH_RULES:
+                await self.bus.call(_dbus_message("AddMatch", "s", [rule]))
+            reply = await self.bus.call(_dbus_message("ListNames"))
+            for name in reply.body[0]:
+                if name.startswith(MPRIS_PREFIX):
+                    owner = await self.bus.call(_dbus_message("GetNameOwner", "s", [name]))
+                    await self._add_player(name, owner.body[0])
+            return self.bus
+
+    async def _add_player(self, name, owner):
+        self.players[name] = {"owner": owner, "status": "Stopped", "metadata": {}}
+        try:
+            reply = await self.bus.call(
+                Message(
+                    destination=name,
+                    path=MPRIS_PATH,
+                    interface=PROPERTIES_INTERFACE,
+                    member="GetAll",
+                    signature="s",
+                    body=[PLAYER_INTERFACE],
+                )
+            )
+        except Exception:
+            logger.exception("Could not query MPRIS player %s", name)
+            return
+        if reply.message_type == MessageType.METHOD_RETURN:
+            self._apply(name, _unwrap(reply.body[0]))
+
+    def _apply(self, name, props):
+        player = self.players.get(name)
+        if player is None:
+            return
+        if "PlaybackStatus" in props:
+            player["status"] = props["PlaybackStatus"]
+        if "Metadata" in props:
+            player["metadata"] = _unwrap(props["Metadata"])
+        if name == self.active:
+            self._notify()
+
+    def _on_message(self, msg):
+        if msg.message_type != MessageType.SIGNAL:
+            return
+        if msg.member == "NameOwnerChanged":
+            name, old, new = msg.body
+            if not name.startswith(MPRIS_PREFIX):
+                return
+            previous = self.active
+            self.players.pop(name, None)
+            if new:
+                create_task(self._add_player(name, new))
+            if self.active != previous:
+                self._notify()
+        elif msg.member == "PropertiesChanged" and msg.body[0] == PLAYER_INTERFACE:
+            for name, player in self.players.items():
+                if player["owner"] == msg.sender:
+                    self._apply(name, _unwrap(msg.body[1]))
+                    break
+
+    @property
+    def active(self):
+        """The playing player if there is one, otherwise the newest."""
+        for name in reversed(self.players):
+            if self.players[name]["status"] == "Playing":
+                return name
+        return next(reversed(self.players), None)
+
+    def now_playing(self):
+        name = self.active
+        if name is None:
+            return None
+        player = self.players[name]
+        metadata = player["metadata"]
+        artists = metadata.get("xesam:artist") or []
+        return {
+            "player": name[len(MPRIS_PREFIX) :],
+            "status": player["status"],
+            "title": metadata.get("xesam:title", ""),
+            "artist": ", ".join(artists) if isinstance(artists, list) else artists,
+            "album": metadata.get("xesam:album", ""),
+        }
+
+    def _notify(self):
+        info = self.now_playing()
+        for callback in self.callbacks:
+            callback(info)
+
+    def subscribe(self, callback):
+        self.callbacks.add(callback)
+        create_task(self.connect())
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+    async def call(self, member):
+        await self.connect()
+        name = self.active
+        if name is None:
+            logger.info("No MPRIS player to send %s to", member)
+            return
+        self.calls += 1
+        await self.bus.call(
+            Message(
+                destination=self.players[name]["owner"],
+                path=MPRIS_PATH,
+                interface=PLAYER_INTERFACE,
+                member=member,
+            )
+        )
+
+
+if "controller" not in globals():
+    controller = MprisController()
+
+
+def play_pause(qtile):
+    create_task(controller.call("PlayPause"))
+
+
+def next_track(qtile):
+    create_task(controller.call("Next"))
+
+
+def previous_track(qtile):
+    create_task(controller.call("Previous"))
+
+
+class NowPlaying(DamageMixin, widget.TextBox):
+    """Shows the active player's track, updated from MPRIS signals."""
+
+    defaults = [
+        ("format", "{artist} - {title}", "Format for the playing track"),
+        ("no_player_text", "", "Text shown when no player is around"),
+    ]
+
+    def __init__(self, **config):
+        super().__init__("", **config)
+        self.add_defaults(NowPlaying.defaults)
+
+    def _configure(self, qtile, bar):
+        super()._configure(qtile, bar)
+        controller.subscribe(self._on_change)
+        self._on_change(controller.now_playing())
+
+    def _on_change(self, info):
+        if info is None or not info["title"]:
+            self.update(self.no_player_text)
+        else:
+            self.update(self.format.format(**info))
+
+    def finalize(self):
+        controller.unsubscribe(self._on_change)
+        super().finalize()
@@ -0,0 +1,171 @@
+"""
+One system-metrics sampler shared by every bar.
+
+Each source (/proc/stat, /proc/meminfo, statvfs per partition) is read
+ at most once per update interval no matter how many widgets on how
+many screens display it. Widgets below are drop-in replacements for the
+qtile_extras ones that format from the shared readings instead of polling
+on their own.
+"""
+
+import os
+import threading
+import time
+from types import MappingProxyType
+
+import psutil
+from qtile_extras import widget
+
+import power
+from damage import DamageMixin
+from ticker import TickMixin
+from visibility import VisibilityMixin
+
+# A widget whose timer fires a touch early should still get the cached value
+# rather than trigger a second read within the same interval
+_SLACK = 0.9
+
+
+class Sampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._readers = {}
+        # name -> (timestamp, value); values are never mutated once stored
+        self._values = {}
+        self.reads = {}
+        self.hits = {}
+
+    def add_source(self, name, reader):
+        self._readers.setdefault(name, reader)
+
+    def read(self, name, max_age):
+        with self._lock:
+            now = time.monotonic()
+            stamp, value = self._values.get(name, (None, None))
+            if stamp is not None and now - stamp < max_age * _SLACK:
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return value
+            value = self._readers[name]()
+            self._values[name] = (now, value)
+            self.reads[name] = self.reads.get(name, 0) + 1
+            return value
+
+    def snapshot(self):
+        """Read-only view of the latest value of every source."""
+        with self._lock:
+            return MappingProxyType({k: v for k, (_, v) in self._values.items()})
+
+
+def _read_cpu():
+    return psutil.cpu_percent(), psutil.cpu_freq()
+
+
+def _read_memory():
+    return psutil.virtual_memory(), psutil.swap_memory()
+
+
+if "sampler" not in globals():
+    sampler = Sampler()
+    sampler.add_source("cpu", _read_cpu)
+    sampler.add_source("memory", _read_memory)
+
+
+class CPU(VisibilityMixin, TickMixin, DamageMixin, widget.CPU):
+    def poll(self):
+        percent, freq = sampler.read("cpu", self.update_interval)
+        variables = dict()
+
+        variables["load_percent"] = round(percent, 1)
+        if psutil.__version__ == "5.9.0":
+            variables["freq_current"] = round(freq.current, 1)
+        else:
+            variables["freq_current"] = round(freq.current / 1000, 1)
+        variables["freq_max"] = round(freq.max / 1000, 1)
+        variables["freq_min"] = round(freq.min / 1000, 1)
+
+        return self.format.format(**variables)
+
+
+class Memory(VisibilityMixin, TickMixin, DamageMixin, widget.Memory):
+    def poll(self):
+        mem, swap = sampler.read("memory", self.update_interval)
+        val = {}
+        val["MemUsed"] = mem.used / self.calc_mem
+        val["MemTotal"] = mem.total / self.calc_mem
+        val["MemFree"] = mem.free / self.calc_mem
+        val["Available"] = mem.available / self.calc_mem
+        val["NotAvailable"] = (mem.total - mem.available) / self.calc_mem
+        val["MemPercent"] = mem.percent
+        val["Buffers"] = mem.buffers / self.calc_mem
+        val["Active"] = mem.active / self.calc_mem
+        val["Inactive"] = mem.inactive / self.calc_mem
+        val["Shmem"] = mem.shared / self.calc_mem
+        val["SwapTotal"] = swap.total / self.calc_swap
+        val["SwapFree"] = swap.free / self.calc_swap
+        val["SwapUsed"] = swap.used / self.calc_swap
+        val["SwapPercent"] = swap.percent
+        val["mm"] = self.measure_mem
+        val["ms"] = self.measure_swap
+
+        return self.format.format(**val)
+
+
+class DF(VisibilityMixin, TickMixin, DamageMixin, widget.DF):
+    def __init__(self, **config):
+        super().__init__(**config)
+        self._source = f"statvfs:{self.partition}"
+        sampler.add_source(self._source, lambda p=self.partition: os.statvfs(p))
+
+    def poll(self):
+        statvfs = sampler.read(self._source, self.update_interval)
+
+        size = statvfs.f_frsize * statvfs.f_blocks // self.calc
+        free = statvfs.f_frsize * statvfs.f_bfree // self.calc
+        self.user_free = statvfs.f_frsize * statvfs.f_bavail // self.calc
+
+        if self.visible_on_warn and self.user_free >= self.warn_space:
+            text = ""
+        else:
+            text = self.format.format(
+                p=self.partition,
+                s=size,
+                f=free,
+                uf=self.user_free,
+                m=self.measure,
+                r=(size - self.user_free) / size * 100,
+            )
+
+        return text
+
+
+class _SharedBattery:
+    # Stands in for the widget's own _Battery so Battery.poll (notifications,
+    # build_string) works unchanged on top of the shared reading
+    force_charge = False
+
+    def update_status(self):
+        if power.monitor.status is None:
+            raise RuntimeError("no battery reading yet")
+        return power.monitor.status
+
+
+class Battery(VisibilityMixin, TickMixin, DamageMixin, widget.Battery):
+    def __init__(self, **config):
+        # Pushed from power_supply uevents, see power.py
+        config.setdefault("update_interval", None)
+        super().__init__(**config)
+
+    @staticmethod
+    def _load_battery(**config):
+        return _SharedBattery()
+
+    def _configure(self, qtile, bar):
+        super()._configure(qtile, bar)
+        power.monitor.subscribe(self._on_change)
+
+    def _on_change(self, status):
+        self.update(self.poll())
+
+    def finalize(self):
+        power.monitor.unsubscribe(self._on_change)
+        super().finalize()
@@ -0,0 +1,91 @@
+"""
+Monitor topology straight from the RandR extension.
+
+qtile reloads every module in the config folder on reload_config, but
+importlib.reload re-runs the module inside the same namespace, so anything
+guarded by a ``globals()`` check below survives reloads and hotplugs.
+"""
+
+import subprocess
+from typing import NamedTuple
+
+from Xlib import display as xdisplay
+
+
+class Monitor(NamedTuple):
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+    primary: bool
+
+
+if "_display" not in globals():
+    _display = None
+    # ((timestamp, config_timestamp), monitors)
+    _cache = (None, ())
+
+
+def _connection():
+    global _display
+    if _display is None:
+        _display = xdisplay.Display()
+    return _display
+
+
+def get_monitors():
+    """Return the active monitors, re-querying only when the RandR config changed."""
+    global _cache
+    d = _connection()
+    root = d.screen().root
+
+    # GetScreenResourcesCurrent is a cheap round trip that doesn't poll the
+    # outputs; its timestamps only move when the configuration does.
+    resources = root.xrandr_get_screen_resources_current()
+    stamp = (resources.timestamp, resources.config_timestamp)
+    if stamp == _cache[0]:
+        return _cache[1]
+
+    monitors = tuple(
+        Monitor(
+            name=d.get_atom_name(m.name),
+            x=m.x,
+            y=m.y,
+            width=m.width_in_pixels,
+            height=m.height_in_pixels,
+            primary=bool(m.primary),
+        )
+        for m in root.xrandr_get_monitors().monitors
+    )
+    _cache = (stamp, monitors)
+    return monitors
+
+
+def invalidate():
+    global _cache
+    _cache = (None, ())
+
+
+def xrandr_num_monitors():
+    # The old way of doing it, kept around for the benchmark below
+    result = subprocess.run(
+        ["xrandr", "--listmonitors"], stdout=subprocess.PIPE, text=True, check=True
+    )
+    return int(result.stdout.splitlines()[0].split()[1])
+
+
+if __name__ == "__main__":
+    # python monitors.py -- compare against shelling out to xrandr
+    import timeit
+
+    runs = 200
+    for label, func in (
+        ("xrandr --listmonitors", xrandr_num_monitors),
+        ("randr (uncached)", lambda: (invalidate(), get_monitors())),
+        ("randr (cached)", get_monitors),
+    ):
+        best = min(timeit.repeat(func, number=runs, repeat=3)) / runs
+        print(f"{label:<24}{best * 1e6:10.1f} us/call")
+    for monitor in get_monitors():
+        print(monitor)
@@ -0,0 +1,281 @@
+"""
+Battery state from power_supply uevents.
+
+The kernel announces battery and AC changes over a NETLINK_KOBJECT_UEVENT
+socket, so the battery reading is updated from those and pushed to
+subscribers. Not every firmware sends capacity updates, so a fallback poll
+is kept. It runs slowly on AC and faster as the charge runs low.
+Time-to-empty comes from the charge trend over a rolling window rather
+than from one noisy power_now sample.
+
+Recorded uevents can be replayed without hardware:
+
+    python power.py record > uevents.txt   # on a laptop, unplug/replug AC
+    python power.py replay uevents.txt
+
+Each record starts with an @seconds line giving when it arrived, so a
+replay sees the same charge trend the recording did.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import time
+from collections import deque
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+from libqtile.widget.battery import BatteryState, BatteryStatus, load_battery
+
+NETLINK_KOBJECT_UEVENT = 15
+
+# Fallback poll intervals in seconds
+POLL_ON_AC = 300
+POLL_ON_BATTERY = 60
+POLL_LOW = 15
+LOW_PERCENT = 0.15
+
+# Seconds of charge history used for the time-to-empty estimate
+WINDOW = 600
+
+_STATES = {
+    "Full": BatteryState.FULL,
+    "Charging": BatteryState.CHARGING,
+    "Discharging": BatteryState.DISCHARGING,
+    "Not charging": BatteryState.NOT_CHARGING,
+}
+
+
+def parse_uevent(data):
+    """Turn a raw uevent datagram into a dict of its KEY=VALUE fields."""
+    props = {}
+    for field in data.split(b"\0"):
+        key, sep, value = field.partition(b"=")
+        if sep:
+            props[key.decode()] = value.decode(errors="replace")
+    return props
+
+
+def status_from_uevent(props):
+    """Build a BatteryStatus from a battery's POWER_SUPPLY_* fields."""
+
+    def number(*names):
+        for name in names:
+            value = props.get(f"POWER_SUPPLY_{name}")
+            if value is not None:
+                return float(value)
+        return None
+
+    state = _STATES.get(props.get("POWER_SUPPLY_STATUS"), BatteryState.UNKNOWN)
+    # energy is in uWh with power in uW, charge in uAh with current in uA;
+    # VOLTAGE_NOW (uV) converts between the two
+    power_now, current_now = number("POWER_NOW"), number("CURRENT_NOW")
+    voltage = number("VOLTAGE_NOW")
+    now, full = number("ENERGY_NOW"), number("ENERGY_FULL")
+    if now is not None and full:
+        rate = power_now
+        if not rate and current_now and voltage:
+            rate = current_now * voltage / 1e6
+    else:
+        now, full = number("CHARGE_NOW"), number("CHARGE_FULL")
+        rate = current_now
+        if not rate and power_now and voltage:
+            rate = power_now / voltage * 1e6
+    if now is not None and full:
+        percent = now / full
+    else:
+        percent = (number("CAPACITY") or 0) / 100
+
+    if rate and now is not None and full:
+        remaining = now if state == BatteryState.DISCHARGING else full - now
+        seconds = int(3600 * remaining / rate)
+    else:
+        seconds = 0
+
+    if power_now is not None:
+        power = power_now / 1e6
+    else:
+        power = current_now * voltage / 1e12 if current_now and voltage else 0.0
+
+    return BatteryStatus(
+        state=state,
+        percent=percent,
+        power=power,
+        time=seconds,
+        charge_start_threshold=0,
+        charge_end_threshold=100,
+    )
+
+
+class BatteryMonitor:
+    def __init__(self, window=WINDOW, clock=time.monotonic):
+        self.status = None
+        self.on_ac = None
+        self.callbacks = set()
+        self.window = window
+        self.clock = clock
+        # (clock time, percent) while discharging
+        self._history = deque()
+        self._sock = None
+        self._battery = None
+        self._handle = None
+        self.events = 0
+        self.polls = 0
+
+    def start(self):
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT
+            )
+            sock.bind((0, 1))  # kernel uevent multicast group
+            sock.setblocking(False)
+        except OSError:
+            logger.exception("Could not listen for uevents, polling the battery only")
+        else:
+            self._sock = sock
+            asyncio.get_running_loop().add_reader(sock.fileno(), self._read_socket)
+        self.poll()
+
+    def stop(self):
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _read_socket(self):
+        while True:
+            try:
+                data = self._sock.recv(8192)
+            except BlockingIOError:
+                return
+            self.handle_uevent(parse_uevent(data))
+
+    def handle_uevent(self, props):
+        if props.get("SUBSYSTEM") != "power_supply":
+            return
+        self.events += 1
+        kind = props.get("POWER_SUPPLY_TYPE")
+        if kind == "Mains":
+            online = props.get("POWER_SUPPLY_ONLINE") == "1"
+            if online != self.on_ac:
+                self.on_ac = online
+                # Charging state flips with AC; don't wait for the battery's
+                # event (only when running live, not when replaying)
+                if self._handle is not None:
+                    self.poll()
+        elif kind == "Battery":
+            self._publish(status_from_uevent(props))
+
+    def poll(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.polls += 1
+        try:
+            if self._battery is None:
+                self._battery = load_battery()
+            self._publish(self._battery.update_status())
+        except Exception:
+            logger.exception("Failed to read battery status")
+        self._handle = qtile.call_later(self.poll_interval(), self.poll)
+
+    def poll_interval(self):
+        status = self.status
+        if status is None:
+            return POLL_ON_BATTERY
+        if status.state in (BatteryState.CHARGING, BatteryState.FULL) or self.on_ac:
+            return POLL_ON_AC
+        if status.percent <= LOW_PERCENT:
+            return POLL_LOW
+        return POLL_ON_BATTERY
+
+    def _smoothed_time(self, status):
+        now = self.clock()
+        if status.state != BatteryState.DISCHARGING:
+            self._history.clear()
+            return status.time
+        self._history.append((now, status.percent))
+        while self._history and now - self._history[0][0] > self.window:
+            self._history.popleft()
+        (t0, p0), (t1, p1) = self._history[0], self._history[-1]
+        if t1 - t0 < 60 or p0 <= p1:
+            # Not enough of a trend yet, the kernel's estimate will do
+            return status.time
+        rate = (p0 - p1) / (t1 - t0)
+        return int(p1 / rate)
+
+    def _publish(self, status):
+        status = status._replace(time=self._smoothed_time(status))
+        changed = self.status is not None and self.status.state != status.state
+        self.status = status
+        if changed and self._handle is not None:
+            # Moving between AC and battery changes the fallback rate too
+            self._handle.cancel()
+            self._handle = qtile.call_later(self.poll_interval(), self.poll)
+        for callback in self.callbacks:
+            callback(status)
+
+    def subscribe(self, callback):
+        self.callbacks.add(callback)
+        if self._handle is None and self._sock is None:
+            self.start()
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+
+if "monitor" not in globals():
+    monitor = BatteryMonitor()
+
+
+def read_recording(path):
+    """Yield (seconds, props) for each record of a recorded uevent file."""
+    with open(path) as f:
+        records = f.read().split("\n\n")
+    when = 0.0
+    for record in records:
+        props = {}
+        for line in record.splitlines():
+            if line.startswith("@"):
+                when = float(line[1:])
+            elif "=" in line:
+                key, value = line.split("=", 1)
+                props[key] = value
+        if props:
+            yield when, props
+
+
+def replay(path):
+    """Feed a recorded uevent file to a monitor on the recording's clock."""
+    now = 0.0
+    target = BatteryMonitor(clock=lambda: now)
+    for now, props in read_recording(path):
+        target.handle_uevent(props)
+        if target.status is not None:
+            print(f"@{now:g} {target.status} poll every {target.poll_interval()}s")
+    return target
+
+
+def record():
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    sock.bind((os.getpid(), 1))
+    start = time.monotonic()
+    while True:
+        props = parse_uevent(sock.recv(8192))
+        if props.get("SUBSYSTEM") == "power_supply":
+            lines = [f"@{time.monotonic() - start:.1f}"]
+            lines += [f"{k}={v}" for k, v in props.items()]
+            print("\n".join(lines), end="\n\n", flush=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["record"]:
+        record()
+    elif sys.argv[1:2] == ["replay"]:
+        replay(sys.argv[2])
+    else:
+        print(__doc__)
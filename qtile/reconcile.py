@@ -0,0 +1,81 @@
+"""
+Incremental screen reconfiguration.
+
+Instead of reloading the whole config on every screen_change, keep the
+existing Screen objects (and with them their bars and widget state) and only
+create or drop the ones for monitors that appeared or went away.
+"""
+
+import time
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+import monitors
+
+
+def _layout(topology):
+    # qtile aliases monitors sharing an origin (mirrored outputs) into one
+    # screen as big as the largest of them, so compare what qtile will
+    # actually end up with. The size is part of it so that a resolution,
+    # rotation or scale change is not taken for "unchanged".
+    sizes = {}
+    for m in topology:
+        width, height = sizes.get((m.x, m.y), (0, 0))
+        sizes[(m.x, m.y)] = (max(width, m.width), max(height, m.height))
+    return tuple(sorted((x, y, w, h) for (x, y), (w, h) in sizes.items()))
+
+
+class ScreenReconciler:
+    def __init__(self, make_screen, delay=0.25):
+        # make_screen(index) builds a new Screen for the monitor at index
+        self.make_screen = make_screen
+        self.delay = delay
+        self.reconciles = 0
+        self.events = 0
+        self._handle = None
+        try:
+            self._layout = _layout(monitors.get_monitors())
+        except Exception:
+            self._layout = None
+
+    def schedule(self, *_):
+        """screen_change hook: collapse a burst of RandR events into one reconcile."""
+        self.events += 1
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = qtile.call_later(self.delay, self.reconcile)
+
+    def reconcile(self):
+        self._handle = None
+        start = time.perf_counter()
+
+        try:
+            layout = _layout(monitors.get_monitors())
+        except Exception:
+            logger.exception("Could not query monitors, reconfiguring as-is")
+            layout = None
+
+        if layout is not None and layout == self._layout:
+            logger.info("Monitor layout unchanged, skipping reconcile")
+            return
+
+        screens = qtile.config.screens
+        if layout:
+            count = len(layout)
+            # Screens past the end are dropped; qtile finalizes their bars
+            # once they are no longer part of qtile.screens
+            del screens[count:]
+            for i in range(len(screens), count):
+                screens.append(self.make_screen(i))
+
+        self._layout = layout
+        qtile.reconfigure_screens()
+        self.reconciles += 1
+        logger.info(
+            "Reconciled %d screen(s) in %.1fms (%d events, %d reconciles)",
+            len(qtile.screens),
+            (time.perf_counter() - start) * 1000,
+            self.events,
+            self.reconciles,
+        )
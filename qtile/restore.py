@@ -0,0 +1,204 @@
+"""
+Bring a saved session back the way it was laid out.
+
+Apps are launched a few at a time rather than in one serial burst, and
+each new window is matched back to the slot it came from: by pid first,
+then WM_CLASS, then title, since plenty of apps hand their window to a
+forked child. Matched windows go straight to their old group with their
+old floating state and geometry. A group isn't laid out again until all
+of its windows have arrived (or the wait times out), so it's arranged
+once instead of once per window.
+"""
+
+import time
+from collections import defaultdict
+
+from libqtile import hook, qtile
+from libqtile.log_utils import logger
+
+from layoutstate import freeze_layout, thaw_layout
+
+MAX_CONCURRENT = 4
+# Seconds to wait for a launched app's window before giving up on it
+TIMEOUT = 15
+
+
+class SessionRestore:
+    def __init__(self, slots, max_concurrent=MAX_CONCURRENT, timeout=TIMEOUT, on_settled=None):
+        self.queue = list(slots)
+        # Called with each slot once its window is placed or it's given up on
+        self.on_settled = on_settled
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        # pid -> slot for launched apps that haven't shown a window yet
+        self.launched = {}
+        # group name -> slots still to arrive
+        self.waiting = defaultdict(int)
+        for slot in self.queue:
+            if slot.get("group"):
+                self.waiting[slot["group"]] += 1
+        self.frozen = set()
+        # screen index -> group it was showing
+        self.screens = {
+            slot["screen"]: slot["group"]
+            for slot in self.queue
+            if slot.get("screen") is not None and slot.get("group")
+        }
+        # window -> slot, between client_new and client_managed
+        self._placing = {}
+        self.start_time = None
+        self.elapsed = None
+        self.matched = 0
+        self.timed_out = 0
+
+    def start(self):
+        self.start_time = time.monotonic()
+        hook.subscribe.client_new(self.on_client_new)
+        hook.subscribe.client_managed(self.on_client_managed)
+        hook.subscribe.client_killed(self.on_client_killed)
+        for name in self.waiting:
+            self._freeze(name)
+        self._launch_more()
+
+    # Launching
+
+    def _launch_more(self):
+        while self.queue and len(self.launched) < self.max_concurrent:
+            slot = self.queue.pop(0)
+            pid = qtile.spawn([slot["exe"]])
+            if pid <= 0:
+                self._done(slot)
+                self._settle(slot)
+                continue
+            slot["launched"] = time.monotonic()
+            self.launched[pid] = slot
+            qtile.call_later(self.timeout, self._expire, pid)
+        if not self.queue and not self.launched and not self._placing:
+            self._finish()
+
+    def _expire(self, pid):
+        slot = self.launched.pop(pid, None)
+        if slot is not None:
+            logger.warning("No window from %s after %ss", slot["exe"], self.timeout)
+            self.timed_out += 1
+            self._done(slot)
+            self._settle(slot)
+            self._launch_more()
+
+    # Matching
+
+    def _match(self, window):
+        if not self.launched:
+            return None
+        pid = window.get_pid()
+        if pid in self.launched:
+            return pid
+        wm_class = window.get_wm_class() or []
+        for key, slot in self.launched.items():
+            if wm_class and wm_class == slot.get("wm_class"):
+                return key
+        name = window.name
+        for key, slot in self.launched.items():
+            if name and name == slot.get("title"):
+                return key
+        return None
+
+    def on_client_new(self, window):
+        key = self._match(window)
+        if key is None:
+            return
+        slot = self.launched.pop(key)
+        self.matched += 1
+        logger.info(
+            "Restored %s in %.2fs", slot["exe"], time.monotonic() - slot["launched"]
+        )
+        group = slot.get("group")
+        if group in qtile.groups_map:
+            window.togroup(group)
+        self._placing[window] = slot
+        # Not every window that's matched goes on to be managed
+        qtile.call_later(self.timeout, self._expire_placing, window)
+        self._done(slot)
+
+    def on_client_managed(self, window):
+        slot = self._placing.pop(window, None)
+        if slot is None:
+            return
+        if slot.get("floating") and slot.get("geometry"):
+            x, y, w, h = slot["geometry"]
+            window.set_position_floating(x, y)
+            window.set_size_floating(w, h)
+        self._settle(slot)
+        self._launch_more()
+
+    def on_client_killed(self, window):
+        # Matched in client_new but gone before client_managed
+        slot = self._placing.pop(window, None)
+        if slot is None:
+            return
+        self._settle(slot)
+        self._launch_more()
+
+    def _expire_placing(self, window):
+        slot = self._placing.pop(window, None)
+        if slot is not None:
+            logger.warning("Window of %s was never managed", slot["exe"])
+            self._settle(slot)
+            self._launch_more()
+
+    # Deferred layout
+
+    def _freeze(self, name):
+        group = qtile.groups_map.get(name)
+        if group is not None:
+            freeze_layout(group)
+            self.frozen.add(name)
+
+    def _thaw(self, name):
+        if name not in self.frozen:
+            return
+        self.frozen.discard(name)
+        group = qtile.groups_map.get(name)
+        if group is not None:
+            thaw_layout(group)
+
+    def _done(self, slot):
+        name = slot.get("group")
+        if name:
+            self.waiting[name] -= 1
+            if self.waiting[name] <= 0:
+                self._thaw(name)
+
+    def _settle(self, slot):
+        if self.on_settled is not None:
+            self.on_settled(slot)
+
+    def _finish(self):
+        if self.elapsed is not None:
+            return
+        for name in list(self.frozen):
+            self._thaw(name)
+        for index, name in self.screens.items():
+            if index < len(qtile.screens) and name in qtile.groups_map:
+                qtile.screens[index].set_group(qtile.groups_map[name])
+        hook.unsubscribe.client_new(self.on_client_new)
+        hook.unsubscribe.client_managed(self.on_client_managed)
+        hook.unsubscribe.client_killed(self.on_client_killed)
+        self.elapsed = time.monotonic() - self.start_time
+        logger.info(
+            "Session restored in %.2fs: %d windows placed, %d timed out",
+            self.elapsed,
+            self.matched,
+            self.timed_out,
+        )
+
+
+if "engine" not in globals():
+    engine = None
+
+
+def restore(slots, **kwargs):
+    global engine
+    engine = SessionRestore(slots, **kwargs)
+    engine.start()
+    return engine
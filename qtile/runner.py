@@ -0,0 +1,128 @@
+"""
+Run shell commands without blocking qtile's event loop.
+
+os.system() waits for the command to exit on the event loop thread, so
+keys and window handling freeze until it does. Commands here run as asyncio
+subprocesses with an optional timeout and output capture, a cap on how many
+run at once, and per-command latency stats so slow key bindings stand out.
+"""
+
+import asyncio
+import itertools
+import os
+import signal
+import time
+
+from libqtile.log_utils import logger
+from libqtile.utils import create_task, send_notification
+
+MAX_CONCURRENT = 4
+# Like os.system, commands run until they exit unless a caller asks for a timeout
+DEFAULT_TIMEOUT = None
+# Seconds to wait for output after killing a command
+DRAIN_TIMEOUT = 2
+
+
+class CommandRunner:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, timeout=DEFAULT_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self._semaphore = None
+        self._ids = itertools.count(1)
+        # job id -> (command, task)
+        self.jobs = {}
+        # command -> [runs, total seconds, worst seconds, timeouts]
+        self.latency = {}
+
+    def run(self, command, timeout=None, on_output=None, notify=False):
+        """Start command in the background and return its job id."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        job_id = next(self._ids)
+        task = create_task(
+            self._run(job_id, command, timeout or self.timeout, on_output, notify)
+        )
+        self.jobs[job_id] = (command, task)
+        return job_id
+
+    async def _run(self, job_id, command, timeout, on_output, notify):
+        capture = on_output is not None or notify
+        start = time.monotonic()
+        timed_out = False
+        try:
+            async with self._semaphore:
+                proc = await asyncio.create_subprocess_shell(
+                    command,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.STDOUT if capture else asyncio.subprocess.DEVNULL,
+                    # Its own process group, so a kill reaches what the shell started
+                    start_new_session=True,
+                )
+                try:
+                    output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    logger.warning("Command timed out after %ss: %s", timeout, command)
+                    _kill_group(proc)
+                    try:
+                        output, _ = await asyncio.wait_for(proc.communicate(), DRAIN_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        # Something outside the group still holds the pipe
+                        output = b""
+                except asyncio.CancelledError:
+                    _kill_group(proc)
+                    try:
+                        await asyncio.wait_for(proc.wait(), DRAIN_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+                    raise
+
+            text = output.decode(errors="replace") if output else ""
+            if on_output is not None:
+                on_output(proc.returncode, text)
+            if notify:
+                send_notification(command, text.strip() or f"Exited with {proc.returncode}")
+        except asyncio.CancelledError:
+            logger.info("Cancelled: %s", command)
+        except Exception:
+            logger.exception("Failed to run: %s", command)
+        finally:
+            self.jobs.pop(job_id, None)
+            self._record(command, time.monotonic() - start, timed_out)
+
+    def _record(self, command, elapsed, timed_out):
+        stats = self.latency.setdefault(command, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[3] += timed_out
+
+    def cancel(self, job_id=None):
+        """Cancel one job, or every in-flight job if no id is given."""
+        ids = list(self.jobs) if job_id is None else [job_id]
+        for i in ids:
+            job = self.jobs.get(i)
+            if job is not None:
+                job[1].cancel()
+
+    def slowest(self, n=5):
+        return sorted(
+            (
+                (command, runs, total / runs, worst, timeouts)
+                for command, (runs, total, worst, timeouts) in self.latency.items()
+            ),
+            key=lambda row: row[2],
+            reverse=True,
+        )[:n]
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+if "runner" not in globals():
+    runner = CommandRunner()
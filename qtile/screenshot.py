@@ -0,0 +1,189 @@
+"""
+Screenshots without leaving qtile.
+
+screenshotter.sh removed the old file, ran flameshot to write a PNG to
+/tmp and then ran notify-send: three processes and a disk round trip
+per shot. Here the pixels are read with MIT-SHM GetImage into a shared
+memory segment (no copy through the X socket), the clipboard is taken
+at once with that capture behind it, and the PNG is encoded from the
+same memory in a worker thread. The key handler returns as soon as the
+capture is in; a paste that arrives before encoding finishes waits for
+it. One notification is sent when the PNG is ready.
+"""
+
+import ctypes
+import io
+import time
+
+import cairocffi
+import xcffib
+import xcffib.shm
+import xcffib.xproto
+from libqtile.log_utils import logger
+from libqtile.utils import send_notification
+
+import clipboard
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+_libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+_libc.shmat.restype = ctypes.c_void_p
+_libc.shmdt.argtypes = [ctypes.c_void_p]
+_libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+if "stats" not in globals():
+    # Seconds from key press to capture / clipboard / encoded PNG, last shot
+    stats = {"shots": 0, "capture": None, "clipboard": None, "encoded": None}
+
+
+class Capture:
+    """BGRX pixels of a screen area, in shared memory or a bytes copy."""
+
+    def __init__(self, data, width, height, addr=None):
+        self.data = data
+        self.width = width
+        self.height = height
+        self._addr = addr
+
+    def encode_png(self):
+        surface = cairocffi.ImageSurface.create_for_data(
+            self.data, cairocffi.FORMAT_RGB24, self.width, self.height, self.width * 4
+        )
+        out = io.BytesIO()
+        surface.write_to_png(out)
+        surface.finish()
+        return out.getvalue()
+
+    def release(self):
+        if self._addr is not None:
+            _libc.shmdt(self._addr)
+            self._addr = None
+        self.data = None
+
+
+def capture(conn, drawable, x, y, width, height, use_shm=True):
+    """Read a 24/32 bit ZPixmap of drawable's area."""
+    if use_shm:
+        size = width * height * 4
+        shmid = _libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        addr = _libc.shmat(shmid, None, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            _libc.shmctl(shmid, IPC_RMID, None)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        shm = conn(xcffib.shm.key)
+        seg = conn.generate_id()
+        try:
+            shm.Attach(seg, shmid, False)
+            shm.GetImage(
+                drawable,
+                x,
+                y,
+                width,
+                height,
+                0xFFFFFFFF,
+                xcffib.xproto.ImageFormat.ZPixmap,
+                seg,
+                0,
+            ).reply()
+            shm.Detach(seg)
+            conn.flush()
+        finally:
+            # Freed once we detach too
+            _libc.shmctl(shmid, IPC_RMID, None)
+        data = (ctypes.c_char * size).from_address(addr)
+        return Capture(data, width, height, addr)
+
+    reply = conn.core.GetImage(
+        xcffib.xproto.ImageFormat.ZPixmap, drawable, x, y, width, height, 0xFFFFFFFF
+    ).reply()
+    return Capture(bytearray(reply.data.buf()), width, height)
+
+
+def area(qtile, mode):
+    if mode == "screen":
+        s = qtile.current_screen
+        return s.x, s.y, s.width, s.height
+    if mode == "window":
+        w = qtile.current_window
+        if w is not None:
+            bw = w.borderwidth
+            return w.x + bw, w.y + bw, w.width, w.height
+    root = qtile.core.conn.conn.get_setup().roots[qtile.core.conn.conn.pref_screen]
+    return 0, 0, root.width_in_pixels, root.height_in_pixels
+
+
+def take(qtile, mode="full"):
+    """Screenshot to the clipboard; mode is full, screen or window."""
+    start = time.perf_counter()
+    conn = qtile.core.conn.conn
+    root = qtile.core._root.wid
+    x, y, width, height = area(qtile, mode)
+    try:
+        shot = capture(conn, root, x, y, width, height)
+    except Exception:
+        logger.exception("MIT-SHM capture failed, using GetImage")
+        shot = capture(conn, root, x, y, width, height, use_shm=False)
+    captured = time.perf_counter()
+
+    png = qtile.run_in_executor(shot.encode_png)
+    clipboard.get_owner().offer({"image/png": png})
+    offered = time.perf_counter()
+
+    def done(future):
+        shot.release()
+        if future.cancelled() or future.exception() is not None:
+            logger.error("Could not encode screenshot: %s", future.exception())
+            return
+        stats["shots"] += 1
+        stats["capture"] = captured - start
+        stats["clipboard"] = offered - start
+        stats["encoded"] = time.perf_counter() - start
+        send_notification("Screenshot", f"Copied {mode} ({width}x{height}) to the clipboard")
+
+    png.add_done_callback(done)
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Capture-to-clipboard latency against the X server in $DISPLAY, e.g.
+    #   Xvfb :99 -screen 0 3840x2160x24 & DISPLAY=:99 python screenshot.py
+    runs = int(sys.argv[1]) if sys.argv[1:] else 20
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(1)
+        conn = xcffib.connect()
+        screen = conn.get_setup().roots[conn.pref_screen]
+        owner = clipboard.SelectionOwner()
+        for use_shm in (True, False):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                shot = capture(
+                    conn, screen.root, 0, 0, screen.width_in_pixels, screen.height_in_pixels, use_shm
+                )
+                png = loop.run_in_executor(executor, shot.encode_png)
+                owner.offer({"image/png": png})
+                owned = time.perf_counter()
+                await png
+                encoded = time.perf_counter()
+                shot.release()
+                timings.append((owned - start, encoded - start))
+            owned = sorted(t[0] for t in timings)[runs // 2]
+            encoded = sorted(t[1] for t in timings)[runs // 2]
+            print(
+                f"{'shm' if use_shm else 'GetImage':>8}: clipboard {owned * 1000:7.2f}ms,"
+                f" png ready {encoded * 1000:7.2f}ms (median of {runs})"
+            )
+        owner.close()
+
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Remembers which apps are open so they can be brought back next login.
+
+Windows are kept in a dict keyed by wid, each with the slot it occupied
+(group, screen, floating state and geometry) for restore.py to put it
+back into. Each process's executable is looked up once, not on every
+client_managed. Changes are appended to a journal (one JSON record per
+line) rather than rewriting the whole file, and the journal is compacted
+down to a snapshot once it's mostly history. The slots of the last
+session stay in the journal as pending until restore.py has brought
+each one back or given up on it, so a crash or logout halfway through a
+restore doesn't lose them.
+A crash can only cost the record being written; a torn last line is
+dropped on load.
+"""
+
+import json
+import os
+import tempfile
+
+import psutil
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+CONFIG_PATH = os.path.expanduser("~/.config/qtile/")
+JOURNAL_PATH = os.path.join(CONFIG_PATH, "json", "session.jsonl")
+
+excluded_apps = ["plank"]
+
+# Compact once the journal holds this many records per live window...
+COMPACT_RATIO = 4
+# ...but never bother below this many records
+COMPACT_MIN = 64
+
+
+class Session:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        # wid -> slot, in the order windows appeared
+        self.apps = {}
+        # key -> slot of the last session not yet restored
+        self.pending = {}
+        # wid -> pid, pid -> window count and pid -> exe; an exe is forgotten
+        # with the pid's last window so a reused pid can't inherit it
+        self._pids = {}
+        self._windows_per_pid = {}
+        self._exes = {}
+        self._fd = None
+        self.records = 0
+        self.compactions = 0
+        self.exe_lookups = 0
+
+    # journal
+
+    def load(self):
+        """Replay the journal into self.apps; returns False if there was none."""
+        self.apps = {}
+        self.pending = {}
+        self.records = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        good = 0
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._apply(record)
+                except (ValueError, KeyError, TypeError):
+                    if not line.endswith(b"\n"):
+                        # Torn write from a crash: drop it so later appends
+                        # don't get glued onto the garbage
+                        logger.warning("Dropping incomplete session record")
+                        break
+                    logger.warning("Skipping bad session record: %r", line)
+                else:
+                    self.records += 1
+                good += len(line)
+        if good != os.path.getsize(self.path):
+            os.truncate(self.path, good)
+        return True
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "add":
+            self.apps[record["wid"]] = record.get("slot") or {"exe": record["exe"]}
+        elif op == "update":
+            self.apps[record["wid"]].update(record["slot"])
+        elif op == "remove":
+            self.apps.pop(record["wid"], None)
+        elif op == "clear":
+            self.apps.clear()
+        elif op == "pending":
+            self.pending[record["key"]] = record["slot"]
+        elif op == "settled":
+            self.pending.pop(record["key"], None)
+        else:
+            raise ValueError(op)
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _append(self, record):
+        # A single O_APPEND write per record, so a crash leaves at worst one
+        # partial line at the end
+        data = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        try:
+            os.write(self._open(), data)
+        except OSError:
+            logger.exception("Could not write to %s", self.path)
+            return
+        self.records += 1
+        live = len(self.apps) + len(self.pending)
+        if self.records > max(COMPACT_MIN, COMPACT_RATIO * live):
+            self.compact()
+
+    def compact(self):
+        """Replace the journal with one record per live window and pending slot."""
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, "w") as f:
+                for wid, slot in self.apps.items():
+                    f.write(json.dumps({"op": "add", "wid": wid, "slot": slot}) + "\n")
+                for key, slot in self.pending.items():
+                    f.write(json.dumps({"op": "pending", "key": key, "slot": slot}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.exception("Could not compact %s", self.path)
+            return
+        self.close()
+        self.records = len(self.apps) + len(self.pending)
+        self.compactions += 1
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # windows
+
+    def exe_for(self, wid, pid):
+        exe = self._exes.get(pid)
+        if exe is None:
+            self.exe_lookups += 1
+            exe = self._exes[pid] = psutil.Process(pid).exe()
+        old = self._pids.get(wid)
+        if old != pid:
+            if old is not None:
+                self._forget_pid(old)
+            self._pids[wid] = pid
+            self._windows_per_pid[pid] = self._windows_per_pid.get(pid, 0) + 1
+        return exe
+
+    def _forget_pid(self, pid):
+        count = self._windows_per_pid.get(pid, 0) - 1
+        if count > 0:
+            self._windows_per_pid[pid] = count
+        else:
+            self._windows_per_pid.pop(pid, None)
+            self._exes.pop(pid, None)
+
+    @staticmethod
+    def placement(window):
+        """Where a window currently is, as stored in its slot."""
+        group = window.group
+        screen = group.screen if group is not None else None
+        return {
+            "group": group.name if group is not None else None,
+            "screen": screen.index if screen is not None else None,
+            "floating": window.floating,
+            "geometry": [window.x, window.y, window.width, window.height],
+        }
+
+    def add_app(self, window):
+        wid, pid = window.wid, window.get_pid()
+        if wid in self.apps or not pid or window.group is None:
+            return
+        if window.group.name == "scratchpad":
+            return
+        try:
+            exe = self.exe_for(wid, pid)
+        except psutil.Error:
+            logger.info("Could not find the executable of window %s", wid)
+            return
+        if any(i in exe for i in excluded_apps):
+            logger.info("NOT adding excluded app %s to session", exe)
+            return
+        logger.info("Adding %s to session", exe)
+        slot = {
+            "exe": exe,
+            "pid": pid,
+            "wm_class": window.get_wm_class() or [],
+            "title": window.name,
+            **self.placement(window),
+        }
+        self.apps[wid] = slot
+        self._append({"op": "add", "wid": wid, "slot": slot})
+
+    def capture(self, window):
+        """Journal a window's placement if it moved group or floating state."""
+        slot = self.apps.get(window.wid)
+        if slot is None:
+            return
+        placement = self.placement(window)
+        # Geometry alone changes too often to journal; save() picks it up
+        if any(slot.get(k) != placement[k] for k in ("group", "screen", "floating")):
+            slot.update(placement)
+            self._append({"op": "update", "wid": window.wid, "slot": placement})
+
+    def save(self):
+        """Refresh every slot from the live windows and compact."""
+        for wid, slot in self.apps.items():
+            window = qtile.windows_map.get(wid)
+            if window is not None and window.group is not None:
+                slot.update(self.placement(window))
+        self.compact()
+
+    def remove_app(self, wid):
+        pid = self._pids.pop(wid, None)
+        if pid is not None:
+            self._forget_pid(pid)
+        slot = self.apps.pop(wid, None)
+        if slot is not None:
+            logger.info("Removing %s from session", slot["exe"])
+            self._append({"op": "remove", "wid": wid})
+
+    def settle(self, slot):
+        """Drop a pending slot once it has been restored or given up on."""
+        for key, pending in self.pending.items():
+            if pending is slot:
+                del self.pending[key]
+                self._append({"op": "settled", "key": key})
+                return
+
+    def clear(self):
+        logger.info("Clearing session")
+        self.apps.clear()
+        self._append({"op": "clear"})
+
+    def from_windows(self):
+        logger.info("Setting session from current windows")
+        self.clear()
+        for window in list(qtile.windows_map.values()):
+            if getattr(window, "group", None) is not None:
+                self.add_app(window)
+
+    def log(self):
+        logger.info("Session: %s", self.apps)
+
+
+if "session" not in globals():
+    session = None
+
+
+def start():
+    """Load the last session and return the slots of the windows that were open."""
+    global session
+    session = Session()
+    if not session.load():
+        session.from_windows()
+        return []
+    # Slots left pending by a restore that never finished come back too.
+    # The old wids mean nothing now; the restored windows add themselves.
+    slots = list(session.pending.values()) + list(session.apps.values())
+    session.pending = dict(enumerate(slots))
+    session.from_windows()
+    session.compact()
+    return slots
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # Journal vs. rewrite-the-whole-file cost for a churn of window events
+    n = int(sys.argv[1]) if sys.argv[1:] else 10000
+    with tempfile.TemporaryDirectory() as root:
+        s = Session(os.path.join(root, "session.jsonl"))
+        start_time = time.perf_counter()
+        for wid in range(n):
+            s.apps[wid] = {"exe": "/usr/bin/app"}
+            s._append({"op": "add", "wid": wid, "slot": {"exe": "/usr/bin/app"}})
+            if wid > 20:
+                s.apps.pop(wid - 20)
+                s._append({"op": "remove", "wid": wid - 20})
+        journal = time.perf_counter() - start_time
+
+        path = os.path.join(root, "session.json")
+        apps = []
+        start_time = time.perf_counter()
+        for wid in range(n):
+            apps.append({"wid": wid, "exe": "/usr/bin/app"})
+            if wid > 20:
+                apps = [a for a in apps if a["wid"] != wid - 20]
+            with open(path, "w") as f:
+                json.dump(apps, f)
+        rewrite = time.perf_counter() - start_time
+
+        # Simulate a crash mid-write and check only that record is lost
+        with open(s.path, "ab") as f:
+            f.write(b'{"op":"add","wid":')
+        live = dict(s.apps)
+        s.close()
+        s.load()
+        assert s.apps == live, "journal replay mismatch"
+
+        print(f"{n} events: journal {journal:.3f}s, rewrite {rewrite:.3f}s")
+        print(f"compactions {s.compactions}, records now {s.records}")
@@ -0,0 +1,364 @@
+"""
+Window switcher drawn by qtile itself.
+
+`rofi -show window` started a process that listed every client and read
+its title, class and icon over X again each time it opened, although
+qtile already has all of that. Here the windows are kept in an index
+that the client hooks update as things change, with a search string per
+window and the time it was last focused. Icons are scaled to row size
+once per window and cached. Opening the switcher only sorts the index
+and draws the visible rows into one internal window. Typing narrows the
+list with a fuzzy subsequence match, and each extra character only
+searches the windows the previous query matched.
+"""
+
+import time
+
+import cairocffi
+from libqtile import hook, qtile
+from libqtile.log_utils import logger
+
+ROWS = 12
+ROW_HEIGHT = 28
+ICON_SIZE = 20
+WIDTH = 720
+PADDING = 8
+FONT = "Fira Code"
+FONTSIZE = 13
+BACKGROUND = "#1a1b26"
+SELECTED = "#3b4261"
+FOREGROUND = "#c0caf5"
+DIM = "#565f89"
+
+
+def fuzzy_score(query, text):
+    """Score of query as a subsequence of text, or None if it isn't one.
+
+    Both are expected in lower case. Consecutive letters and letters at
+    the start of a word score more.
+    """
+    score = 0
+    pos = 0
+    last = -2
+    for char in query:
+        found = text.find(char, pos)
+        if found < 0:
+            return None
+        if found == last + 1:
+            score += 3
+        if found == 0 or not text[found - 1].isalnum():
+            score += 2
+        score += 1
+        last = found
+        pos = found + 1
+    return score
+
+
+class WindowIndex:
+    def __init__(self):
+        # wid -> record
+        self.windows = {}
+        # wid -> ImageSurface at ICON_SIZE, or None for no icon
+        self._icons = {}
+
+    def subscribe(self):
+        hook.subscribe.client_managed(self.add)
+        hook.subscribe.client_killed(self.remove)
+        hook.subscribe.client_name_updated(self.update)
+        hook.subscribe.client_focus(self.focused)
+        hook.subscribe.group_window_add(self.moved)
+        hook.subscribe.net_wm_icon_change(self.icon_changed)
+        # After a reload the windows are already managed (no qtile under `qtile check`)
+        for window in list(getattr(qtile, "windows_map", {}).values()):
+            if window.wid not in self.windows and getattr(window, "group", None) is not None:
+                self.add(window)
+
+    def add(self, window):
+        if window.group is None:
+            return
+        record = self.windows.get(window.wid)
+        if record is None:
+            record = self.windows[window.wid] = {"window": window, "last_focus": 0.0}
+        self._refresh(record)
+
+    def _refresh(self, record):
+        window = record["window"]
+        wm_class = window.get_wm_class() or []
+        record["title"] = window.name or ""
+        record["wm_class"] = wm_class[-1] if wm_class else ""
+        record["group"] = window.group.name if window.group else ""
+        record["search"] = f"{record['title']} {record['wm_class']} {record['group']}".lower()
+
+    def remove(self, window):
+        self.windows.pop(window.wid, None)
+        self._icons.pop(window.wid, None)
+
+    def update(self, window):
+        record = self.windows.get(window.wid)
+        if record is not None and window.name != record["title"]:
+            self._refresh(record)
+
+    def focused(self, window):
+        record = self.windows.get(window.wid)
+        if record is not None:
+            record["last_focus"] = time.monotonic()
+
+    def moved(self, group, window):
+        record = self.windows.get(window.wid)
+        if record is None:
+            self.add(window)
+        elif record["group"] != group.name:
+            self._refresh(record)
+
+    def icon_changed(self, window):
+        self._icons.pop(window.wid, None)
+
+    def icon(self, window):
+        if window.wid not in self._icons:
+            self._icons[window.wid] = scale_icon(getattr(window, "icons", None))
+        return self._icons[window.wid]
+
+    def search(self, query, candidates=None):
+        """Records matching query, best first; candidates narrows the search."""
+        records = self.windows.values() if candidates is None else candidates
+        if not query:
+            return sorted(records, key=lambda r: -r["last_focus"])
+        scored = []
+        for record in records:
+            score = fuzzy_score(query, record["search"])
+            if score is not None:
+                scored.append((score, record))
+        scored.sort(key=lambda item: (-item[0], -item[1]["last_focus"]))
+        return [record for _, record in scored]
+
+
+def scale_icon(icons):
+    """The window icon closest to ICON_SIZE, scaled to it once."""
+    if not icons:
+        return None
+    name, data = min(icons.items(), key=lambda i: abs(ICON_SIZE - int(i[0].split("x")[0])))
+    width, height = map(int, name.split("x"))
+    source = cairocffi.ImageSurface.create_for_data(
+        data, cairocffi.FORMAT_ARGB32, width, height
+    )
+    surface = cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, ICON_SIZE, ICON_SIZE)
+    with cairocffi.Context(surface) as ctx:
+        ctx.scale(ICON_SIZE / width, ICON_SIZE / height)
+        ctx.set_source_surface(source)
+        ctx.paint()
+    return surface
+
+
+class Switcher:
+    """A searchable list in an internal window; subclasses can list other things."""
+
+    noun = "windows"
+    # Like alt-tab, start on the window before the current one
+    start_at = 1
+
+    def __init__(self, index):
+        self.index = index
+        self.win = None
+        self.drawer = None
+        self._layouts = []
+        self.query = ""
+        self.results = []
+        self.selected = 0
+        self.first = 0
+        self._saved_focus = None
+        self.stats = {"opens": 0, "last_open": None}
+
+    def _create(self):
+        height = ROW_HEIGHT * (ROWS + 1) + PADDING * 2
+        self.win = qtile.core.create_internal(0, 0, WIDTH, height)
+        self.win.process_key_press = self.process_key_press
+        self.win.process_button_click = self.process_button_click
+        self.win.process_window_expose = self.draw
+        self.drawer = self.win.create_drawer(WIDTH, height)
+        self._layouts = [
+            self.drawer.textlayout("", FOREGROUND, FONT, FONTSIZE, None, wrap=False)
+            for _ in range(ROWS + 1)
+        ]
+        for layout in self._layouts:
+            layout.width = WIDTH - PADDING * 3 - ICON_SIZE
+
+    def open(self):
+        start = time.perf_counter()
+        if self.win is None:
+            self._create()
+        self.query = ""
+        self.results = self.index.search("")
+        self.selected = self.start_at if len(self.results) > self.start_at else 0
+        self.first = 0
+        screen = qtile.current_screen
+        self.win.place(
+            screen.x + (screen.width - self.win.width) // 2,
+            screen.y + screen.height // 4,
+            self.win.width,
+            self.win.height,
+            0,
+            None,
+            above=True,
+        )
+        self.win.unhide()
+        self._saved_focus = qtile.current_window
+        self.win.focus(False)
+        self.draw()
+        elapsed = time.perf_counter() - start
+        self.stats["opens"] += 1
+        self.stats["last_open"] = elapsed
+        logger.debug(
+            "%s opened in %.2fms with %d %s",
+            type(self).__name__,
+            elapsed * 1000,
+            len(self.results),
+            self.noun,
+        )
+
+    def label(self, record):
+        return f"{record['title']}  ·  {record['wm_class']}  [{record['group']}]"
+
+    def icon(self, record):
+        return self.index.icon(record["window"])
+
+    def choose(self, record):
+        """Act on the picked record; True if it moved the focus itself."""
+        window = record["window"]
+        group = window.group
+        if group is None:
+            return False
+        if group.screen is None:
+            qtile.current_screen.set_group(group)
+        else:
+            qtile.focus_screen(group.screen.index)
+        group.focus(window)
+        return True
+
+    def close(self, record=None):
+        self.win.hide()
+        saved, self._saved_focus = self._saved_focus, None
+        if record is not None and self.choose(record):
+            return
+        if saved is not None and saved.group is not None:
+            saved.focus(False)
+
+    def _set_query(self, query):
+        if query.startswith(self.query) and self.query:
+            # Anything matching the longer query matched the shorter one
+            candidates = self.results
+        else:
+            candidates = None
+        self.query = query
+        self.results = self.index.search(query, candidates)
+        self.selected = 0
+        self.first = 0
+
+    def _move(self, step):
+        if not self.results:
+            return
+        self.selected = (self.selected + step) % len(self.results)
+        if self.selected < self.first:
+            self.first = self.selected
+        elif self.selected >= self.first + ROWS:
+            self.first = self.selected - ROWS + 1
+
+    def process_key_press(self, keysym):
+        keys = qtile.core.keysym_from_name
+        if keysym == keys("Escape"):
+            self.close()
+            return
+        if keysym == keys("Return"):
+            self.close(self.results[self.selected] if self.results else None)
+            return
+        if keysym in (keys("Down"), keys("Tab")):
+            self._move(1)
+        elif keysym == keys("Up"):
+            self._move(-1)
+        elif keysym == keys("BackSpace"):
+            self._set_query(self.query[:-1])
+        elif 0x20 <= keysym <= 0xFF:
+            self._set_query(self.query + chr(keysym).lower())
+        else:
+            return
+        self.draw()
+
+    def process_button_click(self, x, y, button):
+        row = (y - PADDING) // ROW_HEIGHT - 1
+        if button == 1 and 0 <= row and self.first + row < len(self.results):
+            self.close(self.results[self.first + row])
+
+    def draw(self):
+        self.drawer.clear(BACKGROUND)
+        prompt = self._layouts[0]
+        if self.query:
+            prompt.text = f"> {self.query}"
+        else:
+            prompt.text = f"> ({len(self.results)} {self.noun})"
+        prompt.colour = FOREGROUND if self.query else DIM
+        prompt.draw(PADDING * 2 + ICON_SIZE, PADDING + (ROW_HEIGHT - prompt.height) // 2)
+        visible = self.results[self.first : self.first + ROWS]
+        for row, record in enumerate(visible, 1):
+            y = PADDING + row * ROW_HEIGHT
+            if self.first + row - 1 == self.selected:
+                self.drawer.set_source_rgb(SELECTED)
+                self.drawer.fillrect(PADDING // 2, y, WIDTH - PADDING, ROW_HEIGHT, 0)
+            icon = self.icon(record)
+            if icon is not None:
+                icon_y = y + (ROW_HEIGHT - ICON_SIZE) // 2
+                self.drawer.ctx.set_source_surface(icon, PADDING, icon_y)
+                self.drawer.ctx.paint()
+            layout = self._layouts[row]
+            layout.text = self.label(record)
+            layout.draw(PADDING * 2 + ICON_SIZE, y + (ROW_HEIGHT - layout.height) // 2)
+        self.drawer.draw(offsetx=0, offsety=0, width=self.win.width, height=self.win.height)
+
+
+if "index" not in globals():
+    index = WindowIndex()
+    switcher = Switcher(index)
+
+
+def install():
+    # Hooks are cleared on reload, so this runs on every config load
+    index.subscribe()
+
+
+def show(qtile):
+    switcher.open()
+
+
+if __name__ == "__main__":
+    import random
+    import string
+    import sys
+
+    # Search cost per keystroke with many windows: python switcher.py [count]
+    count = int(sys.argv[1]) if sys.argv[1:] else 500
+    random.seed(1)
+    words = ["".join(random.choices(string.ascii_lowercase, k=6)) for _ in range(200)]
+    index = WindowIndex()
+    for wid in range(count):
+        title = " ".join(random.choices(words, k=5))
+        index.windows[wid] = {
+            "window": None,
+            "title": title,
+            "wm_class": random.choice(words),
+            "group": str(wid % 10),
+            "last_focus": random.random(),
+            "search": title,
+        }
+    query = words[0][:4]
+    start = time.perf_counter()
+    index.search("")
+    print(f"{'open (MRU sort)':>18}: {(time.perf_counter() - start) * 1000:7.3f}ms")
+    full = incremental = 0.0
+    results = None
+    for i in range(1, len(query) + 1):
+        start = time.perf_counter()
+        index.search(query[:i])
+        full += time.perf_counter() - start
+        start = time.perf_counter()
+        results = index.search(query[:i], results)
+        incremental += time.perf_counter() - start
+    print(f"{'typing, full':>18}: {full * 1000:7.3f}ms for {len(query)} keys")
+    print(f"{'typing, narrowed':>18}: {incremental * 1000:7.3f}ms for {len(query)} keys")
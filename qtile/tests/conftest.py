@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The config's helper modules are imported by name, as qtile does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
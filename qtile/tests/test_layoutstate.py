@@ -0,0 +1,178 @@
+"""
+A reload_config round trip through layoutstate.
+
+Stub groups and layouts stand in for qtile's: the old ones are captured,
+new ones are built the way a reload builds them (windows re-added in
+whatever order, default ratios), frozen by the addgroup hook and restored
+by the startup hook. Laying both out must give the same geometry.
+"""
+
+import pytest
+
+try:
+    from libqtile.layout.base import _ClientList
+except (ImportError, OSError) as e:
+    # libqtile raises OSError rather than ImportError when libcairo is missing
+    pytest.skip(f"libqtile is not importable: {e}", allow_module_level=True)
+
+import layoutstate  # noqa: E402
+
+SCREEN = (0, 0, 1000, 600)
+
+
+class StubWindow:
+    def __init__(self, wid):
+        self.wid = wid
+        self.name = f"window {wid}"
+        self.floating = False
+        self.x = self.y = self.width = self.height = 0
+
+
+class StubMonadTall:
+    name = "monadtall"
+
+    def __init__(self):
+        self.ratio = 0.5
+        self.align = 0
+        self.relative_sizes = []
+        self.do_normalize = True
+        self.clients = _ClientList()
+
+    def arrange(self, x, y, width, height):
+        clients = list(self.clients)
+        main = int(width * self.ratio) if len(clients) > 1 else width
+        geometry = {clients[0].wid: (x, y, main, height)} if clients else {}
+        stack = clients[1:]
+        sizes = self.relative_sizes or ([1 / len(stack)] * len(stack) if stack else [])
+        top = y
+        for client, size in zip(stack, sizes):
+            geometry[client.wid] = (x + main, top, width - main, int(height * size))
+            top += int(height * size)
+        return geometry
+
+
+class StubMax:
+    name = "max"
+
+    def __init__(self):
+        self.clients = _ClientList()
+
+    def arrange(self, x, y, width, height):
+        return {c.wid: (x, y, width, height) for c in self.clients}
+
+
+class StubGroup:
+    def __init__(self, name):
+        self.name = name
+        self.layouts = [StubMonadTall(), StubMax()]
+        self.current_layout = 0
+        self.windows = []
+        self.screen = object()
+        self.relayouts = 0
+
+    def add(self, window):
+        self.windows.append(window)
+        for layout in self.layouts:
+            layout.clients.append(window)
+        self.layout_all()
+
+    def use_layout(self, index):
+        self.current_layout = index
+
+    def layout_all(self, warp=False):
+        self.relayouts += 1
+        tiled = self.layouts[self.current_layout].arrange(*SCREEN)
+        for window in self.windows:
+            if not window.floating:
+                window.x, window.y, window.width, window.height = tiled[window.wid]
+
+
+class StubQtile:
+    def __init__(self, groups):
+        self.groups = groups
+        self.groups_map = {g.name: g for g in groups}
+        self.soon = []
+
+    def call_soon(self, func, *args):
+        self.soon.append((func, args))
+
+
+def geometry(groups):
+    return {
+        (g.name, w.wid): (w.floating, w.x, w.y, w.width, w.height)
+        for g in groups
+        for w in g.windows
+    }
+
+
+def build_before():
+    first, second = StubGroup("1"), StubGroup("2")
+    windows = {wid: StubWindow(wid) for wid in (11, 12, 13, 21, 22)}
+    for wid in (11, 12, 13):
+        first.add(windows[wid])
+    tall = first.layouts[0]
+    tall.ratio = 0.65
+    tall.relative_sizes = [0.7, 0.3]
+    tall.clients.swap(windows[11], windows[13])
+    tall.clients.current_index = 2
+    for wid in (21, 22):
+        second.add(windows[wid])
+    second.use_layout(1)
+    windows[22].floating = True
+    windows[22].x, windows[22].y, windows[22].width, windows[22].height = 40, 30, 320, 240
+    for group in (first, second):
+        group.layout_all()
+    return [first, second]
+
+
+def test_reload_keeps_layouts_and_geometry(monkeypatch):
+    before = build_before()
+    expected = geometry(before)
+    expected_order = [c.wid for c in before[0].layouts[0].clients]
+
+    monkeypatch.setattr(layoutstate, "qtile", StubQtile(before))
+    monkeypatch.setattr(layoutstate, "snapshot", None)
+    layoutstate.capture()
+
+    # reload_config: fresh groups, addgroup fires, windows come back
+    after = [StubGroup("1"), StubGroup("2")]
+    qtile = StubQtile(after)
+    monkeypatch.setattr(layoutstate, "qtile", qtile)
+    for group in after:
+        layoutstate.freeze(group.name)
+    for group, wids in zip(after, ((11, 12, 13), (21, 22))):
+        for wid in wids:
+            group.add(StubWindow(wid))
+    assert all(g.relayouts == 0 for g in after), "windows re-added while frozen relaid out"
+
+    layoutstate.apply()
+    assert all("layout_all" not in g.__dict__ for g in after)
+    assert all(g.relayouts == 0 for g in after)
+    # What load_config does for the visible groups after the startup hook
+    for group in after:
+        group.layout_all()
+
+    tall = after[0].layouts[0]
+    assert tall.ratio == 0.65
+    assert tall.relative_sizes == [0.7, 0.3]
+    assert not tall.do_normalize
+    assert [c.wid for c in tall.clients] == expected_order
+    assert tall.clients.current_index == 2
+    assert after[1].current_layout == 1
+    assert geometry(after) == expected
+
+    mismatched = layoutstate.stats["mismatched"]
+    for func, args in qtile.soon:
+        func(*args)
+    assert layoutstate.stats["mismatched"] == mismatched
+
+
+def test_first_load_captures_nothing(monkeypatch):
+    monkeypatch.setattr(layoutstate, "qtile", StubQtile([]))
+    monkeypatch.setattr(layoutstate, "snapshot", None)
+    layoutstate.capture()
+    group = StubGroup("1")
+    layoutstate.freeze("1")
+    layoutstate.apply()
+    group.add(StubWindow(1))
+    assert group.relayouts == 1
@@ -0,0 +1,85 @@
+"""
+Replay of a laptop's power_supply uevents through BatteryMonitor.
+
+fixtures/uevents.txt is in the format `python power.py record` writes:
+on AC and charging, unplugged, a noisy power_now reading while
+discharging, a jump to low charge, then plugged back in.
+"""
+
+import os
+
+import pytest
+
+try:
+    from libqtile.widget.battery import BatteryState
+except (ImportError, OSError) as e:
+    # libqtile raises OSError rather than ImportError when libcairo is missing
+    pytest.skip(f"libqtile is not importable: {e}", allow_module_level=True)
+
+import power  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "uevents.txt")
+
+
+def replay():
+    """(seconds, status, poll interval) after each battery event."""
+    now = 0.0
+    monitor = power.BatteryMonitor(clock=lambda: now)
+    seen = []
+    for now, props in power.read_recording(FIXTURE):
+        monitor.handle_uevent(props)
+        if props["POWER_SUPPLY_TYPE"] == "Battery":
+            seen.append((now, monitor.status, monitor.poll_interval()))
+    return monitor, seen
+
+
+def test_status_follows_the_recording():
+    monitor, seen = replay()
+    assert [status.state for _, status, _ in seen] == [
+        BatteryState.CHARGING,
+        *[BatteryState.DISCHARGING] * 5,
+        BatteryState.CHARGING,
+    ]
+    assert [round(status.percent, 3) for _, status, _ in seen] == [
+        0.9,
+        0.9,
+        0.897,
+        0.894,
+        0.14,
+        0.137,
+        0.137,
+    ]
+    assert [status.power for _, status, _ in seen] == [15.0, 9.0, 18.0, 4.5, 9.0, 9.0, 20.0]
+    assert monitor.on_ac is True
+    assert monitor.events == 10
+
+
+def test_poll_interval_adapts():
+    _, seen = replay()
+    assert [interval for _, _, interval in seen] == [
+        power.POLL_ON_AC,
+        power.POLL_ON_BATTERY,
+        power.POLL_ON_BATTERY,
+        power.POLL_ON_BATTERY,
+        power.POLL_LOW,
+        power.POLL_LOW,
+        power.POLL_ON_AC,
+    ]
+
+
+def test_time_remaining_is_smoothed():
+    _, seen = replay()
+    times = {when: status.time for when, status, _ in seen}
+    # Charging: (full - now) / power_now
+    assert times[0.2] == 1200
+    # One sample, no trend yet: the kernel's energy / power
+    assert times[31.0] == 18000
+    # power_now spikes to 18 W and dips to 4.5 W (kernel: 8970s and 35760s),
+    # but the charge trend holds at 0.003 per minute
+    assert times[91.0] == pytest.approx(17940, abs=1)
+    assert times[151.0] == pytest.approx(17880, abs=1)
+    # Older samples fall out of the window, so it starts over
+    assert times[2431.0] == 2800
+    assert times[2491.0] == pytest.approx(2740, abs=1)
+    # Back on AC the history is dropped and the charge estimate is used
+    assert times[2501.0] == 7767
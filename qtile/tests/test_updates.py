@@ -0,0 +1,129 @@
+"""
+UpdateChecker against a fake sync DB and a stub checkupdates.
+
+The stub prints whatever is in `out` and exits with the code in `rc`, so
+a test can change what the next check finds.
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+try:
+    import updates
+except (ImportError, OSError) as e:
+    # libqtile raises OSError rather than ImportError when libcairo is missing
+    pytest.skip(f"the widget's imports are not available: {e}", allow_module_level=True)
+
+
+class Repo:
+    def __init__(self, root):
+        self.root = root
+        self.sync = root / "sync"
+        self.sync.mkdir()
+        self.db = self.sync / "core.db"
+        self.db.write_text("")
+        self.cache_file = str(root / "cache" / "checkupdates.json")
+        self.command = f"sleep 0.1; cat {root / 'out'}; exit $(cat {root / 'rc'})"
+        self.set_updates(["a 1 -> 2", "b 1 -> 2"])
+
+    def set_updates(self, lines, rc=0):
+        (self.root / "out").write_text("".join(f"{line}\n" for line in lines))
+        (self.root / "rc").write_text(str(rc))
+
+    def sync_db(self):
+        # A pacman -Sy moves the mtime on
+        os.utime(self.db, ns=(0, time.time_ns() + 10**9))
+
+    def checker(self, **kwargs):
+        return updates.UpdateChecker(
+            self.command,
+            sync_dir=str(self.sync),
+            local_dir=str(self.sync),
+            cache_file=self.cache_file,
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return Repo(tmp_path)
+
+
+def test_unchanged_db_is_not_rechecked(repo):
+    async def main():
+        checker = repo.checker()
+        checker.refresh()
+        await checker._task
+        assert checker.count == 2
+
+        checker.refresh()
+        assert not checker.running
+        assert (checker.runs, checker.skips) == (1, 1)
+
+        repo.sync_db()
+        checker.refresh()
+        assert checker.running
+        await checker._task
+        assert checker.runs == 2
+
+    asyncio.run(main())
+
+
+def test_overlapping_checks_are_skipped(repo):
+    async def main():
+        checker = repo.checker()
+        checker.refresh()
+        task = checker._task
+        checker.refresh()
+        checker.refresh(force=True)
+        assert checker._task is task
+        await task
+        assert (checker.runs, checker.skips) == (1, 2)
+
+    asyncio.run(main())
+
+
+def test_stale_count_is_shown_while_revalidating(repo):
+    async def main():
+        first = repo.checker()
+        first.refresh()
+        await first._task
+
+        # After a restart the last count is there before any check has run
+        repo.set_updates(["a 1 -> 2", "b 1 -> 2", "c 1 -> 2"])
+        repo.sync_db()
+        checker = repo.checker()
+        seen = []
+        checker.subscribe(seen.append)
+        assert checker.count == 2
+        checker.refresh()
+        assert checker.running
+        assert checker.count == 2
+        await checker._task
+        assert checker.count == 3
+        assert seen == [3]
+
+        # A check that fails keeps the old count instead of showing zero
+        repo.set_updates([], rc=1)
+        checker.refresh(force=True)
+        await checker._task
+        assert checker.count == 3
+        assert seen == [3]
+
+    asyncio.run(main())
+
+
+def test_old_count_is_rechecked(repo):
+    async def main():
+        checker = repo.checker(max_age=0)
+        checker.refresh()
+        await checker._task
+        checker.refresh()
+        assert checker.running
+        await checker._task
+        assert checker.runs == 2
+
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Process-wide font and text-measurement cache.
+
+Every widget on every bar builds its own pango layout, parses its font
+string and re-measures its text on each update and each bar redraw. Font
+descriptions are now parsed once per (font, size), and pixel sizes are
+cached per (font, size, markup, wrap width, text) in a memory-capped LRU.
+So "CPU: 12%" shown on three monitors is measured once, not three times.
+Drawing still goes through each widget's own layout; only the measuring is
+shared. All bars live on one X screen with one DPI, so the sizes carry over.
+
+install() hooks the cache into Drawer.textlayout the same way qtile_extras
+injects its decoration code into widget classes.
+"""
+
+import sys
+from collections import OrderedDict
+
+from libqtile import pangocffi
+from libqtile.backend.base import drawer as base_drawer
+
+MAX_BYTES = 1024 * 1024
+
+if "_sizes" not in globals():
+    _fonts = {}
+    # key -> (width, height, approximate bytes)
+    _sizes = OrderedDict()
+    _bytes = 0
+    _hits = 0
+    _misses = 0
+
+
+def font_description(font_family, font_size):
+    key = (font_family, font_size)
+    desc = _fonts.get(key)
+    if desc is None:
+        # set_font_description copies, so one description can be shared
+        desc = _fonts[key] = pangocffi.FontDescription.from_string(
+            f"{font_family} {font_size}px"
+        )
+    return desc
+
+
+def _measure(key, layout):
+    global _bytes, _hits, _misses
+    entry = _sizes.get(key)
+    if entry is not None:
+        _hits += 1
+        _sizes.move_to_end(key)
+        return entry
+    _misses += 1
+    width, height = layout.get_pixel_size()
+    entry = (width, height, sys.getsizeof(key) + sys.getsizeof(key[-1] or "") + 64)
+    _sizes[key] = entry
+    _bytes += entry[2]
+    while _bytes > MAX_BYTES and _sizes:
+        _, (_, _, size) = _sizes.popitem(last=False)
+        _bytes -= size
+    return entry
+
+
+def stats():
+    lookups = _hits + _misses
+    return {
+        "fonts": len(_fonts),
+        "entries": len(_sizes),
+        "bytes": _bytes,
+        "hits": _hits,
+        "misses": _misses,
+        "hit_rate": _hits / lookups if lookups else 0.0,
+    }
+
+
+class CachedTextLayout(base_drawer.TextLayout):
+    def __init__(
+        self, drawer, text, colour, font_family, font_size, font_shadow, wrap=True, markup=False
+    ):
+        self.drawer, self.colour = drawer, colour
+        layout = drawer.ctx.create_layout()
+        layout.set_alignment(pangocffi.ALIGN_CENTER)
+        if not wrap:  # pango wraps by default
+            layout.set_ellipsize(pangocffi.ELLIPSIZE_END)
+        layout.set_font_description(font_description(font_family, font_size))
+        self._font = (font_family, font_size, wrap)
+        self.font_shadow = font_shadow
+        self.layout = layout
+        self.markup = markup
+        self.text = text
+        self._width = None
+
+    def _set_text(self, value):
+        base_drawer.TextLayout.text.fset(self, value)
+        self._raw_text = value
+
+    text = property(base_drawer.TextLayout.text.fget, _set_text)
+
+    def _size(self):
+        key = (*self._font, self.markup, self._width, self._raw_text)
+        return _measure(key, self.layout)
+
+    @property
+    def width(self):
+        if self._width is not None:
+            return self._width
+        return self._size()[0]
+
+    @width.setter
+    def width(self, value):
+        base_drawer.TextLayout.width.fset(self, value)
+
+    @property
+    def height(self):
+        return self._size()[1]
+
+    @property
+    def font_family(self):
+        return base_drawer.TextLayout.font_family.fget(self)
+
+    @font_family.setter
+    def font_family(self, font):
+        base_drawer.TextLayout.font_family.fset(self, font)
+        self._font = (font, *self._font[1:])
+
+    @property
+    def font_size(self):
+        return base_drawer.TextLayout.font_size.fget(self)
+
+    @font_size.setter
+    def font_size(self, size):
+        base_drawer.TextLayout.font_size.fset(self, size)
+        self._font = (self._font[0], size, self._font[2])
+
+
+def _textlayout(self, text, colour, font_family, font_size, font_shadow, markup=False, **kw):
+    """Get a text layout"""
+    return CachedTextLayout(
+        self, text, colour, font_family, font_size, font_shadow, markup=markup, **kw
+    )
+
+
+def install():
+    base_drawer.Drawer.textlayout = _textlayout
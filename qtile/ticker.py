@@ -0,0 +1,195 @@
+"""
+One timer wheel for every polling widget.
+
+Rather than each widget arming its own timer, widgets are parked on
+wall-clock aligned deadlines (every whole second, minute, day... in local
+time). Deadlines from different intervals line up, so a 1s CPU widget and
+a 60s DF widget share a wakeup at the top of the minute. Everything polled
+in one wakeup is applied together and each affected bar is drawn once.
+A poll that hasn't finished shortly after its wakeup isn't waited for:
+the rest of the wakeup is drawn and the late result is applied when it
+arrives.
+"""
+
+import re
+import time
+from datetime import datetime
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+from libqtile.widget import base
+from qtile_extras import widget
+
+from damage import DamageMixin
+from visibility import VisibilityMixin
+
+# Don't land on the deadline we're firing for if the loop woke us a hair early
+_EPSILON = 0.05
+# Seconds a wakeup waits for its executor polls before drawing without them
+FLUSH_TIMEOUT = 0.1
+
+
+def _utc_offset(now):
+    return datetime.fromtimestamp(now).astimezone().utcoffset().total_seconds()
+
+
+def next_boundary(interval, now):
+    local = now + _utc_offset(now)
+    return now + (interval - local % interval)
+
+
+# strftime directives by the smallest unit of time they show
+_SECOND = re.compile(r"%[-_0^#]*[EO]?[SsTXcr]")
+_MINUTE = re.compile(r"%[-_0^#]*[EO]?[MRHIklp]")
+
+
+def format_resolution(fmt):
+    """How often the output of a strftime format can actually change."""
+    if _SECOND.search(fmt):
+        return 1
+    if _MINUTE.search(fmt):
+        return 60
+    return 24 * 60 * 60
+
+
+class _Batch:
+    """The polls started by one wakeup, applied together."""
+
+    def __init__(self):
+        self.pending = 0
+        self.results = []
+        self.started = False
+        self.flushed = False
+        self.handle = None
+
+
+class TimerWheel:
+    def __init__(self):
+        # deadline -> widgets due then
+        self._slots = {}
+        self._due = {}
+        # Batch of the wakeup being fired
+        self._batch = None
+        self._dirty = set()
+        self.deferring = False
+        self.wakeups = 0
+        self.polls = 0
+        self.redraws = 0
+
+    def schedule(self, w):
+        if w in self._due:
+            return
+        deadline = round(next_boundary(w.update_interval, time.time() + _EPSILON), 3)
+        self._due[w] = deadline
+        slot = self._slots.get(deadline)
+        if slot is None:
+            slot = self._slots[deadline] = []
+            qtile.call_later(max(deadline - time.time(), 0), self._fire, deadline)
+        slot.append(w)
+
+    def _fire(self, deadline):
+        self.wakeups += 1
+        widgets = self._slots.pop(deadline, [])
+        batch = self._batch = _Batch()
+        try:
+            for w in widgets:
+                self._due.pop(w, None)
+                if w.finalized:
+                    continue
+                try:
+                    w.timer_setup()
+                except Exception:
+                    logger.exception("Failed to poll %s", w.name)
+        finally:
+            self._batch = None
+        self._started(batch)
+
+    def poll(self, w):
+        self.polls += 1
+        # A widget polled outside a wakeup (e.g. when it's configured) goes alone
+        batch = self._batch or _Batch()
+        if isinstance(w, base.ThreadPoolText):
+            batch.pending += 1
+            future = qtile.run_in_executor(w.poll)
+            future.add_done_callback(lambda f: self._polled(batch, w, f))
+        else:
+            batch.results.append((w, w.poll()))
+        if batch is not self._batch:
+            self._started(batch)
+
+    def _started(self, batch):
+        batch.started = True
+        if batch.pending:
+            # Don't let one slow poll (statvfs on a hung mount) hold up the rest
+            batch.handle = qtile.call_later(FLUSH_TIMEOUT, self._flush, batch)
+        else:
+            self._flush(batch)
+
+    def _polled(self, batch, w, future):
+        batch.pending -= 1
+        try:
+            batch.results.append((w, future.result()))
+        except Exception:
+            logger.exception("poll() of %s raised exceptions", w.name)
+        # Results arriving after the timeout are applied on their own
+        if batch.flushed or (batch.started and not batch.pending):
+            self._flush(batch)
+
+    def _flush(self, batch):
+        if batch.handle is not None:
+            batch.handle.cancel()
+            batch.handle = None
+        batch.flushed = True
+        results, batch.results = batch.results, []
+        self.deferring = True
+        try:
+            for w, text in results:
+                if text is not None:
+                    w.update(text)
+        finally:
+            self.deferring = False
+        for bar in self._dirty:
+            bar.draw()
+        self.redraws += len(self._dirty)
+        self._dirty.clear()
+
+    def defer_draw(self, bar):
+        self._dirty.add(bar)
+
+    def stats(self):
+        return {
+            "widgets": len(self._due),
+            "wakeups": self.wakeups,
+            "polls": self.polls,
+            "redraws": self.redraws,
+        }
+
+
+if "wheel" not in globals():
+    wheel = TimerWheel()
+
+
+class TickMixin:
+    """Replaces a polling widget's own timer with a slot on the wheel."""
+
+    def timer_setup(self):
+        self.tick_once()
+        if self.update_interval is not None:
+            wheel.schedule(self)
+
+    def tick_once(self):
+        wheel.poll(self)
+
+    def draw(self):
+        if wheel.deferring:
+            wheel.defer_draw(self.bar)
+            return
+        super().draw()
+
+
+class Clock(VisibilityMixin, TickMixin, DamageMixin, widget.Clock):
+    def __init__(self, **config):
+        super().__init__(**config)
+        # Redrawing every second for a format without seconds is wasted work
+        self.update_interval = max(self.update_interval, format_resolution(self.format))
+
@@ -0,0 +1,106 @@
+"""
+Rate-limited window title updates.
+
+Browsers and chat apps rewrite _NET_WM_NAME many times a second while
+loading or counting unread messages, and every WindowName widget on every
+bar used to recompute and redraw on each one. Title changes now go
+through one throttle: a title identical to the last one delivered for
+that window is dropped, and each window gets at most one delivery per
+frame budget. The latest title always arrives at the end of a burst.
+"""
+
+import time
+
+from libqtile import hook, qtile
+from qtile_extras import widget
+
+from damage import DamageMixin
+
+# Seconds between title deliveries for one window
+BUDGET = 0.2
+
+
+class TitleThrottle:
+    def __init__(self, budget=BUDGET):
+        self.budget = budget
+        # window -> [last delivered title, time delivered, pending handle]
+        self._windows = {}
+        self.callbacks = set()
+        self.arrived = 0
+        self.duplicates = 0
+        self.rendered = 0
+
+    def on_name_updated(self, window):
+        self.arrived += 1
+        state = self._windows.get(window)
+        if state is None:
+            state = self._windows[window] = [None, 0.0, None]
+        if state[2] is not None:
+            # A delivery is already booked and will pick up this title
+            return
+        wait = state[1] + self.budget - time.monotonic()
+        if wait > 0:
+            state[2] = qtile.call_later(wait, self._deliver, window)
+        else:
+            self._deliver(window)
+
+    def _deliver(self, window):
+        state = self._windows.get(window)
+        if state is None:
+            return
+        state[2] = None
+        if window.name == state[0]:
+            self.duplicates += 1
+            return
+        state[0] = window.name
+        state[1] = time.monotonic()
+        self.rendered += 1
+        for callback in self.callbacks:
+            callback(window)
+
+    def forget(self, window):
+        state = self._windows.pop(window, None)
+        if state is not None and state[2] is not None:
+            state[2].cancel()
+
+    def subscribe(self, callback):
+        self.callbacks.add(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+    def stats(self):
+        return {
+            "arrived": self.arrived,
+            "duplicates": self.duplicates,
+            "rendered": self.rendered,
+        }
+
+
+if "throttle" not in globals():
+    throttle = TitleThrottle()
+
+
+class WindowName(DamageMixin, widget.WindowName):
+    def _configure(self, qtile, bar):
+        super()._configure(qtile, bar)
+        # Title changes come through the throttle instead
+        hook.unsubscribe.client_name_updated(self.hook_response)
+        throttle.subscribe(self._on_title)
+
+    def _on_title(self, window):
+        if self.for_current_screen:
+            shown = self.qtile.current_screen.group.current_window
+        else:
+            shown = self.bar.screen.group.current_window
+        # Titles of windows this bar isn't showing don't matter here
+        if window is shown:
+            self.hook_response()
+
+    def remove_hooks(self):
+        # client_name_updated was already dropped in _configure, and
+        # unsubscribing it again gets logged
+        throttle.unsubscribe(self._on_title)
+        hook.unsubscribe.focus_change(self.hook_response)
+        hook.unsubscribe.float_change(self.hook_response)
+        hook.unsubscribe.current_screen_change(self.hook_response_current_screen)
@@ -0,0 +1,122 @@
+"""
+Layout transactions: many window moves, one relayout per group.
+
+Moving a window between screens calls togroup and then to_screen, and
+each step makes both groups lay out every window again. Inside a
+transaction, layout_all on any group is only noted down. On commit each
+affected group is laid out once (with warp if any deferred call asked
+for it) and X requests are flushed once.
+
+From key bindings, wrap the moves in `with transaction.batch():`. From
+a script over IPC, fire the layout_batch user hook with a JSON list of
+operations:
+
+    qtile cmd-obj -o cmd -f fire_user_hook -a layout_batch \\
+        '[["togroup", 37748743, "2"], ["togroup", 41943047, "2"], ["to_screen", 1]]'
+"""
+
+import functools
+import json
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+from layoutstate import thaw_layout
+
+if "stats" not in globals():
+    # requested: layout_all calls made during transactions
+    # performed: layout_all calls actually run on commit
+    # saved: window reconfigures the skipped calls would have done
+    stats = {"transactions": 0, "requested": 0, "performed": 0, "saved": 0}
+    _active = None
+
+
+class LayoutTransaction:
+    def __init__(self):
+        self.depth = 0
+        # group -> warp, for groups that asked to be laid out
+        self.pending = {}
+        self.frozen = []
+
+    def __enter__(self):
+        self.depth += 1
+        if self.depth == 1:
+            for group in qtile.groups:
+                # Leave groups someone else is already holding alone
+                if "layout_all" not in group.__dict__:
+                    group.layout_all = functools.partial(self._defer, group)
+                    self.frozen.append(group)
+        return self
+
+    def _defer(self, group, warp=False, focus=True):
+        stats["requested"] += 1
+        if group in self.pending:
+            stats["saved"] += len(group.windows)
+        self.pending[group] = self.pending.get(group, False) or warp
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            self.commit()
+
+    def commit(self):
+        global _active
+        _active = None
+        for group in self.frozen:
+            thaw_layout(group, relayout=False)
+        self.frozen.clear()
+        for group, warp in self.pending.items():
+            if group.screen is None:
+                # Hidden groups aren't laid out anyway
+                stats["saved"] += len(group.windows)
+                continue
+            group.layout_all(warp)
+            stats["performed"] += 1
+        self.pending.clear()
+        flush = getattr(qtile.core, "flush", None)
+        if flush is not None:
+            flush()
+        stats["transactions"] += 1
+
+
+def batch():
+    """Context manager; nested batches join the outermost one."""
+    global _active
+    if _active is None:
+        _active = LayoutTransaction()
+    return _active
+
+
+def window_to_screen(qtile, offset, switch_group=False, switch_screen=False):
+    """Move the current window to the screen offset places away."""
+    window = qtile.current_window
+    i = qtile.screens.index(qtile.current_screen)
+    if window is None or not 0 <= i + offset < len(qtile.screens):
+        return
+    with batch():
+        window.togroup(qtile.screens[i + offset].group.name, switch_group=switch_group)
+        if switch_screen:
+            qtile.to_screen(i + offset)
+
+
+def run(ops):
+    """Apply a list of [op, *args] in one transaction; ops may be JSON."""
+    if isinstance(ops, str):
+        ops = json.loads(ops)
+    with batch():
+        for op, *args in ops:
+            try:
+                if op == "togroup":
+                    wid, group = args
+                    qtile.windows_map[int(wid)].togroup(str(group))
+                elif op == "to_screen":
+                    qtile.to_screen(int(args[0]))
+                elif op == "focus":
+                    window = qtile.windows_map[int(args[0])]
+                    if window.group is not None:
+                        window.group.focus(window)
+                else:
+                    logger.warning("Unknown layout_batch operation: %s", op)
+            except Exception:
+                logger.exception("layout_batch %s %s failed", op, args)
+    logger.info("Layout transactions: %s", stats)
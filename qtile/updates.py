@@ -0,0 +1,229 @@
+"""
+Pending package updates without re-running checkupdates every minute.
+
+checkupdates syncs a throwaway copy of the package databases and diffs it
+against the installed packages, which is slow and hits the mirrors. Here
+the count is cached (on disk too, so it's shown straight away after a
+reload or restart) and only recomputed in the background when the
+pacman databases change or the cached count gets old. Only one check per
+command is ever in flight.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from libqtile.log_utils import logger
+from libqtile.utils import create_task
+from qtile_extras import widget
+
+from damage import DamageMixin
+from ticker import TickMixin
+from visibility import VisibilityMixin
+
+SYNC_DIR = "/var/lib/pacman/sync"
+LOCAL_DIR = "/var/lib/pacman/local"
+CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "qtile",
+    "checkupdates.json",
+)
+# New packages only show up upstream, which no local mtime tells us about
+MAX_AGE = 60 * 60
+TIMEOUT = 120
+
+
+def db_signature(sync_dir=SYNC_DIR, local_dir=LOCAL_DIR):
+    """What changes when the repos are synced or packages are installed."""
+    signature = []
+    try:
+        with os.scandir(sync_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".db"):
+                    st = entry.stat()
+                    signature.append([entry.name, st.st_mtime_ns, st.st_size])
+    except OSError:
+        pass
+    signature.sort()
+    try:
+        signature.append(["local", os.stat(local_dir).st_mtime_ns, 0])
+    except OSError:
+        pass
+    return signature
+
+
+class UpdateChecker:
+    def __init__(
+        self,
+        command,
+        sync_dir=SYNC_DIR,
+        local_dir=LOCAL_DIR,
+        cache_file=CACHE_FILE,
+        max_age=MAX_AGE,
+        timeout=TIMEOUT,
+    ):
+        self.command = command
+        self.sync_dir = sync_dir
+        self.local_dir = local_dir
+        self.cache_file = cache_file
+        self.max_age = max_age
+        self.timeout = timeout
+        self.count = None
+        self.signature = None
+        self.checked = 0.0
+        self.callbacks = set()
+        self._task = None
+        self.runs = 0
+        self.skips = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                entry = json.load(f).get(self.command)
+        except (OSError, ValueError):
+            return
+        if entry:
+            self.count = entry["count"]
+            self.signature = entry["signature"]
+            self.checked = entry["checked"]
+
+    def _save(self):
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[self.command] = {
+            "count": self.count,
+            "signature": self.signature,
+            "checked": self.checked,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.cache_file))
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            logger.exception("Could not write %s", self.cache_file)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def stale(self):
+        if self.count is None or time.time() - self.checked > self.max_age:
+            return True
+        return db_signature(self.sync_dir, self.local_dir) != self.signature
+
+    def refresh(self, force=False):
+        """Start a background check if the cached count is out of date."""
+        if self.running:
+            self.skips += 1
+            return
+        if not force and not self.stale():
+            self.skips += 1
+            return
+        self._task = create_task(self._check())
+
+    async def _check(self):
+        self.runs += 1
+        # Taken before running so a sync during the check triggers another
+        signature = db_signature(self.sync_dir, self.local_dir)
+        try:
+            proc = await asyncio.create_subprocess_shell(
+                self.command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                output, _ = await asyncio.wait_for(proc.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                logger.warning("%s timed out after %ss", self.command, self.timeout)
+                return
+        except Exception:
+            logger.exception("Failed to run %s", self.command)
+            return
+        # checkupdates exits 2 for "no updates" and 1 when it couldn't check;
+        # keep showing the old count rather than a bogus zero
+        if proc.returncode not in (0, 2):
+            logger.info("%s exited with %s", self.command, proc.returncode)
+            return
+        self.count = len(output.decode(errors="replace").splitlines())
+        self.signature = signature
+        self.checked = time.time()
+        self._save()
+        for callback in self.callbacks:
+            callback(self.count)
+
+    def subscribe(self, callback):
+        self.callbacks.add(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.discard(callback)
+
+
+if "checkers" not in globals():
+    # command -> UpdateChecker
+    checkers = {}
+
+
+def get_checker(command):
+    checker = checkers.get(command)
+    if checker is None:
+        checker = checkers[command] = UpdateChecker(command)
+    return checker
+
+
+class CheckUpdates(VisibilityMixin, TickMixin, DamageMixin, widget.CheckUpdates):
+    checker = None
+
+    def _configure(self, qtile, bar):
+        super()._configure(qtile, bar)
+        self.checker = get_checker(self.cmd) if self.cmd else None
+        if self.checker is not None:
+            self.checker.subscribe(self._on_change)
+            # Stale while revalidate: show what we knew last time right away
+            if self.checker.count is not None:
+                self.text = self._format(self.checker.count)
+
+    def tick_once(self):
+        # Only a few stat() calls on the event loop; the check itself runs
+        # as a subprocess and reports back through _on_change
+        if self.checker is None:
+            self.update("N/A")
+            return
+        self.checker.refresh()
+
+    def _on_change(self, count):
+        self.update(self._format(count))
+
+    def _format(self, count):
+        num_updates = max(self.custom_command_modify(count), 0)
+        if num_updates == 0:
+            self.layout.colour = self.colour_no_updates
+            return self.no_update_string
+        num_updates = str(num_updates)
+        if self.restart_indicator and os.path.exists("/var/run/reboot-required"):
+            num_updates += self.restart_indicator
+        self.layout.colour = self.colour_have_updates
+        return self.display_format.format(updates=num_updates)
+
+    def _refresh_count(self):
+        # After the on-click command (usually an upgrade) exits, recheck
+        if self._process.poll() is None:
+            self.timeout_add(self.execute_polling_interval, self._refresh_count)
+        elif self.checker is not None:
+            self.checker.refresh(force=True)
+
+    def finalize(self):
+        if self.checker is not None:
+            self.checker.unsubscribe(self._on_change)
+        super().finalize()
+
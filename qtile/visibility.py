@@ -0,0 +1,92 @@
+"""
+Pause polling widgets while nobody can see them.
+
+A widget is hidden while it sits in a closed WidgetBox (WidgetBox takes its
+children out of bar.widgets) or while its screen is covered by a fullscreen
+window. Hidden widgets let their poll timer lapse and skip drawing; as soon
+as they become visible again they poll immediately and restart their timer.
+"""
+
+import time
+
+from libqtile import qtile
+from qtile_extras import widget
+
+
+def is_visible(w):
+    bar = getattr(w, "bar", None)
+    if bar is None or w not in bar.widgets:
+        return False
+    screen = getattr(bar, "screen", None)
+    group = getattr(screen, "group", None)
+    if group is not None and any(
+        getattr(win, "fullscreen", False) for win in group.windows
+    ):
+        return False
+    return True
+
+
+class VisibilityMixin:
+    """Mixed into timer-driven widgets (ThreadPoolText/InLoopPollText style)."""
+
+    visible = True
+    _paused_at = None
+    _skipped = 0
+
+    def timer_setup(self):
+        if not is_visible(self):
+            # Let the timer lapse, refresh() restarts it once we're shown
+            self.visible = False
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+            return
+        super().timer_setup()
+
+    def draw(self):
+        if not self.visible:
+            return
+        super().draw()
+
+    @property
+    def skipped_polls(self):
+        skipped = self._skipped
+        if self._paused_at is not None and self.update_interval:
+            skipped += int((time.monotonic() - self._paused_at) / self.update_interval)
+        return skipped
+
+    def set_visible(self, visible):
+        if visible == self.visible:
+            return False
+        self.visible = visible
+        if visible and self._paused_at is not None:
+            self._skipped = self.skipped_polls
+            self._paused_at = None
+            self.timer_setup()
+        return True
+
+
+def refresh(*_):
+    """Re-evaluate every widget's visibility; safe to hook to anything."""
+    bars = set()
+    for w in list(qtile.widgets_map.values()):
+        if isinstance(w, VisibilityMixin) and w.set_visible(is_visible(w)):
+            if w.visible:
+                bars.add(w.bar)
+    # Text may not have changed while hidden, so update() alone won't repaint
+    for bar in bars:
+        bar.draw()
+
+
+def skipped_polls():
+    return {
+        name: w.skipped_polls
+        for name, w in qtile.widgets_map.items()
+        if isinstance(w, VisibilityMixin)
+    }
+
+
+class WidgetBox(widget.WidgetBox):
+    def toggle_widgets(self):
+        super().toggle_widgets()
+        refresh()
+
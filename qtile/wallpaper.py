@@ -0,0 +1,180 @@
+"""
+Wallpapers decoded and scaled once, then mapped from disk.
+
+Each Screen used to decode the JPEG and scale it on its own, and again on
+every reload_config and hotplug. Here every (image, mode, resolution)
+gets one scaled surface. It's written to ~/.cache/qtile/wallpapers as
+raw ARGB32 pixels keyed by the image's mtime, and later paints just mmap
+that file (a private mapping, so screens of the same size share the
+pages). In memory the surfaces are shared by screens and survive
+reloads.
+"""
+
+import hashlib
+import mmap
+import os
+import resource
+import tempfile
+import time
+
+import cairocffi
+import cairocffi.pixbuf
+from libqtile import config
+from libqtile.log_utils import logger
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "qtile",
+    "wallpapers",
+)
+FORMAT = cairocffi.FORMAT_ARGB32
+
+if "_surfaces" not in globals():
+    # (path, mtime_ns, mode, width, height) -> ImageSurface
+    _surfaces = {}
+    stats = {"memory": 0, "mapped": 0, "decoded": 0, "last_paint": None}
+
+
+def render(image, mode, width, height):
+    """Scale a decoded image to width x height the way qtile's painter does."""
+    target = cairocffi.ImageSurface(FORMAT, width, height)
+    with cairocffi.Context(target) as context:
+        image_w, image_h = image.get_width(), image.get_height()
+        if mode == "fill":
+            width_ratio = width / image_w
+            if width_ratio * image_h >= height:
+                context.scale(width_ratio)
+            else:
+                height_ratio = height / image_h
+                context.translate(-(image_w * height_ratio - width) // 2, 0)
+                context.scale(height_ratio)
+            context.set_source_surface(image)
+        elif mode == "stretch":
+            context.scale(sx=width / image_w, sy=height / image_h)
+            context.set_source_surface(image)
+        elif mode == "center":
+            context.set_source_surface(
+                image, x=(width - image_w) / 2, y=(height - image_h) / 2
+            )
+        else:
+            context.set_source_surface(image)
+        context.paint()
+    target.flush()
+    return target
+
+
+def _cache_prefix(path, mode, width, height):
+    key = f"{os.path.abspath(path)}\0{mode}\0{width}x{height}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _map(filename, width, height):
+    stride = cairocffi.ImageSurface.format_stride_for_width(FORMAT, width)
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size != stride * height:
+            return None
+        # Copy-on-write: writable for cairo, but never written to, so the
+        # pages stay shared with the page cache
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return cairocffi.ImageSurface.create_for_data(data, FORMAT, width, height, stride)
+
+
+def _store(surface, cache_dir, prefix, mtime):
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        # Renders of an older version of the image
+        if name.startswith(prefix + "-"):
+            os.unlink(os.path.join(cache_dir, name))
+    fd, tmp = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(surface.get_data())
+    filename = os.path.join(cache_dir, f"{prefix}-{mtime}.argb")
+    os.replace(tmp, filename)
+    return filename
+
+
+def get_surface(path, mode, width, height, cache_dir=CACHE_DIR):
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, mtime, mode, width, height)
+    surface = _surfaces.get(key)
+    if surface is not None:
+        stats["memory"] += 1
+        return surface
+
+    prefix = _cache_prefix(path, mode, width, height)
+    filename = os.path.join(cache_dir, f"{prefix}-{mtime}.argb")
+    try:
+        surface = _map(filename, width, height)
+    except OSError:
+        surface = None
+    if surface is not None:
+        stats["mapped"] += 1
+    else:
+        stats["decoded"] += 1
+        with open(path, "rb") as f:
+            image, _ = cairocffi.pixbuf.decode_to_image_surface(f.read())
+        surface = render(image, mode, width, height)
+        try:
+            surface = _map(_store(surface, cache_dir, prefix, mtime), width, height)
+        except OSError:
+            logger.exception("Could not cache wallpaper for %s", path)
+
+    # Older versions of this image at this size are no longer needed
+    for old in [k for k in _surfaces if k[0] == path and k[2:] == key[2:]]:
+        del _surfaces[old]
+    _surfaces[key] = surface
+    return surface
+
+
+def paint(screen, path, mode=None):
+    start = time.perf_counter()
+    try:
+        image = get_surface(path, mode, screen.width, screen.height)
+    except OSError:
+        logger.exception("Could not load wallpaper:")
+        return
+    painter = screen.qtile.core.painter
+    root_pixmap, surface = painter._get_root_pixmap_and_surface(screen)
+    with cairocffi.Context(surface) as context:
+        context.set_source_surface(image, screen.x, screen.y)
+        context.rectangle(screen.x, screen.y, screen.width, screen.height)
+        context.fill()
+    surface.finish()
+    painter._update_root_pixmap(root_pixmap)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stats["last_paint"] = elapsed
+    logger.info(
+        "Painted wallpaper on screen %s in %.1fms (peak RSS %d KiB, cache %s)",
+        screen.index,
+        elapsed * 1000,
+        peak,
+        {k: v for k, v in stats.items() if k != "last_paint"},
+    )
+
+
+class Screen(config.Screen):
+    def paint(self, path, mode=None):
+        # The root pixmap painter is X11 only
+        if self.qtile and self.qtile.core.name == "x11":
+            paint(self, path, mode)
+        else:
+            super().paint(path, mode)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Time decode+scale against mapping the cached render
+    path = sys.argv[1]
+    width, height = (int(n) for n in (sys.argv[2:4] or (1920, 1080)))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("decode", "mapped", "memory"):
+            if label == "mapped":
+                _surfaces.clear()
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            get_surface(path, "fill", width, height, cache_dir=cache_dir)
+            elapsed = time.perf_counter() - start
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"{label:>7}: {elapsed * 1000:8.2f}ms, peak RSS +{peak - before} KiB")